@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""変換処理のベンチマーク
+
+runs/ の実データと合成ラン（通常〜エンドレス）をフィクスチャとして、
+ランファイルのデコード・パーサーの各処理・翻訳・CLIのバッチ変換とコーパスの書き出し、
+モジュールの読み込み時間（-X importtime）とCLIの起動時間を計測し、結果をJSONで保存する。
+    
+    uv run python benchmarks/bench.py -o benchmark-results.json
+"""
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import click
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+import json_to_markdown  # noqa: E402
+from corpus_export import load_table  # noqa: E402
+from json_to_markdown import STSRunParser  # noqa: E402
+from run_loader import decode_run  # noqa: E402
+from run_model import RunModel  # noqa: E402
+from run_stats import RunStats  # noqa: E402
+from synthetic import generate_run  # noqa: E402
+from translation_table import translate, cache_info  # noqa: E402
+
+# 合成フィクスチャの規模: 名前 -> (ラン数, 階層数, デッキ枚数)
+SYNTHETIC_SCALES = {
+    "normal": (20, 55, 30),
+    "long": (4, 500, 80),
+    "endless": (1, 3000, 250),
+}
+
+def load_real_runs():
+    """runs/ 以下の実データを読み込む"""
+    return [json.loads(path.read_bytes()) for path in sorted((REPO_ROOT / "runs").rglob("*.run"))]
+
+def build_fixtures(scales):
+    fixtures = {"real": load_real_runs()}
+    for name in scales:
+        count, floors, deck_size = SYNTHETIC_SCALES[name]
+        fixtures[f"synthetic-{name}"] = [generate_run(floors, deck_size, seed) for seed in range(count)]
+    return fixtures
+
+def count_floors(runs):
+    return sum(run.get("floor_reached", 0) for run in runs)
+
+def measure(fn, repeat):
+    """fn を repeat 回実行した最短の壁時計時間と、tracemalloc で計測したピークメモリを返す"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def decode_cases(runs):
+    """ランファイルのデコード（全体・必要なフィールドのみ・コンパクトなモデルへの変換）を計測するケース
+    
+    デコード結果は保持したままにするため、ピークメモリは保持されるランデータの大きさを含む。
+    """
+    blobs = [json.dumps(run).encode("utf-8") for run in runs]
+    
+    def decode_json():
+        return [json.loads(blob) for blob in blobs]
+    
+    def decode_selective():
+        return [decode_run(blob, RunModel.FIELDS) for blob in blobs]
+    
+    def decode_model():
+        return [RunModel.from_dict(decode_run(blob, RunModel.FIELDS)) for blob in blobs]
+    
+    return {
+        "decode_json": decode_json,
+        "decode_run": decode_selective,
+        "decode_run_model": decode_model,
+    }
+
+def parser_cases(runs):
+    """パーサーの各処理を計測するケース"""
+    def parse_all():
+        for run in runs:
+            STSRunParser(run, "en", True)
+    
+    def floor_data():
+        for run in runs:
+            parser = STSRunParser(run, "en", True)
+            for floor in range(1, run.get("floor_reached", 0) + 1):
+                parser.get_floor_data(floor)
+    
+    def deck_replay():
+        for run in runs:
+            parser = STSRunParser(run, "en", True)
+            for _ in parser._iter_deck_states(run.get("floor_reached", 0)):
+                pass
+    
+    def deck_display():
+        for run in runs:
+            parser = STSRunParser(run, "ja", True)
+            for _ in parser._iter_deck_displays(run.get("floor_reached", 0)):
+                pass
+    
+    def relics():
+        for run in runs:
+            parser = STSRunParser(run, "en", True)
+            for floor in range(run.get("floor_reached", 0) + 1):
+                parser._get_relics_at_floor(floor)
+    
+    def potions():
+        for run in runs:
+            parser = STSRunParser(run, "en", True)
+            for _ in parser._iter_potion_states(run.get("floor_reached", 0)):
+                pass
+    
+    def stats():
+        run_stats = RunStats()
+        for run in runs:
+            run_stats.add(RunModel.from_dict(run))
+    
+    def render(lang, show_deck_details):
+        def fn():
+            for run in runs:
+                STSRunParser(run, lang, show_deck_details).to_markdown()
+        return fn
+    
+    def render_langs(langs, show_deck_details):
+        # 再生結果を共有し、言語ごとに翻訳と整形のみ行う（--lang en,ja）
+        def fn():
+            for run in runs:
+                parser = STSRunParser(run, langs[0], show_deck_details)
+                for parser in [parser] + [parser.with_lang(lang) for lang in langs[1:]]:
+                    parser.to_markdown()
+        return fn
+    
+    return {
+        "parser_init": parse_all,
+        "get_floor_data": floor_data,
+        "deck_replay": deck_replay,
+        "deck_display": deck_display,
+        "relics_at_floor": relics,
+        "potion_replay": potions,
+        "stats_accumulate": stats,
+        "to_markdown": render("en", False),
+        "to_markdown_deck_details": render("en", True),
+        "to_markdown_ja_deck_details": render("ja", True),
+        "to_markdown_en_ja_deck_details": render_langs(("en", "ja"), True),
+    }
+
+def translation_keys(runs):
+    """ランデータに現れる翻訳対象のIDを集める"""
+    keys = []
+    for run in runs:
+        keys.extend(run.get("master_deck", []))
+        keys.extend(run.get("relics", []))
+        keys.extend(path for path in run.get("path_per_floor", []) if path)
+        for choice in run.get("card_choices", []):
+            keys.extend(choice.get("not_picked", []) or [])
+    return keys
+
+def write_runs(runs, directory):
+    """フィクスチャを .run ファイルとして書き出す（CLIのバッチ変換用）"""
+    for i, run in enumerate(runs):
+        char_dir = directory / run.get("character_chosen", "UNKNOWN")
+        char_dir.mkdir(parents=True, exist_ok=True)
+        (char_dir / f"{i:06d}.run").write_text(json.dumps(run), encoding="utf-8")
+
+def import_times(module, repeat):
+    """新しいインタープリターで module を -X importtime 付きで読み込み、最短の回の読み込み時間（マイクロ秒）を返す
+    
+    戻り値は (module の累積時間, {モジュール: 自身の時間})。
+    """
+    best = None
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stderr
+        self_times = {}
+        total = None
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            self_times[name.strip()] = int(self_us)
+            if name.strip() == module:
+                total = int(cumulative_us)
+        if best is None or total < best[0]:
+            best = (total, self_times)
+    return best
+
+def cold_start_seconds(args, repeat):
+    """CLIを新しいプロセスで実行した最短の壁時計時間"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(REPO_ROOT / "json_to_markdown.py"), *args], cwd=REPO_ROOT, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def result_entry(name, fixture, runs, seconds, peak, items=None):
+    floors = count_floors(runs)
+    entry = {
+        "benchmark": name,
+        "fixture": fixture,
+        "runs": len(runs),
+        "floors": floors,
+        "seconds": seconds,
+        "runs_per_second": len(runs) / seconds if seconds else None,
+        "floors_per_second": floors / seconds if seconds else None,
+        "peak_memory_bytes": peak,
+    }
+    if items is not None:
+        entry["items"] = items
+        entry["items_per_second"] = items / seconds if seconds else None
+    return entry
+
+def scaling_report(results):
+    """合成フィクスチャ間での1階層あたりのコストの比（通常規模を1とする）。1を大きく超えると超線形"""
+    report = {}
+    per_floor = {}
+    for entry in results:
+        if entry["fixture"].startswith("synthetic-") and entry["floors"]:
+            per_floor.setdefault(entry["benchmark"], {})[entry["fixture"]] = entry["seconds"] / entry["floors"]
+    for name, costs in per_floor.items():
+        base = costs.get("synthetic-normal")
+        if base:
+            report[name] = {fixture: cost / base for fixture, cost in costs.items()}
+    return report
+
+@click.command()
+@click.option('--output', '-o', default='benchmark-results.json', type=click.Path(dir_okay=False), help='Result JSON file')
+@click.option('--repeat', '-r', default=3, type=click.IntRange(min=1), help='Repetitions per benchmark (best time is reported)')
+@click.option('--scales', default=','.join(SYNTHETIC_SCALES), help='Comma-separated synthetic scales (normal,long,endless)')
+@click.option('--filter', '-k', 'name_filter', default='', help='Only run benchmarks whose name contains this string')
+def main(output, repeat, scales, name_filter):
+    """Benchmark parsing, rendering, translation and the batch CLI."""
+    scale_names = [name for name in scales.split(',') if name]
+    for name in scale_names:
+        if name not in SYNTHETIC_SCALES:
+            raise click.BadParameter(f"unknown scale: {name}", param_hint='--scales')
+    
+    fixtures = build_fixtures(scale_names)
+    results = []
+    
+    def record(entry):
+        results.append(entry)
+        rate = entry.get("items_per_second") or entry["floors_per_second"] or 0
+        unit = "items/s" if "items" in entry else "floors/s"
+        click.echo(f"{entry['benchmark']:<32} {entry['fixture']:<20} {entry['seconds'] * 1000:10.2f} ms {rate:14.0f} {unit} {entry['peak_memory_bytes'] / 1024:10.0f} KiB")
+    
+    for fixture, runs in fixtures.items():
+        for name, fn in {**decode_cases(runs), **parser_cases(runs)}.items():
+            if name_filter in name:
+                seconds, peak = measure(fn, repeat)
+                record(result_entry(name, fixture, runs, seconds, peak))
+    
+    if name_filter in "translate":
+        keys = translation_keys(fixtures["real"])
+        
+        def translate_all():
+            for lang in ("en", "ja"):
+                for key in keys:
+                    translate(key, lang)
+        
+        seconds, peak = measure(translate_all, repeat)
+        record(result_entry("translate", "real", fixtures["real"], seconds, peak, items=len(keys) * 2))
+    
+    # CLIのバッチ変換（読み込み・変換・書き込み）をシリアル実行で計測（1言語とすべての言語）
+    cli_batch_cases = [
+        (name, lang) for name, lang in (("cli_batch", "ja"), ("cli_batch_all_langs", "all")) if name_filter in name
+    ]
+    if cli_batch_cases:
+        json_to_markdown.console.quiet = True
+        try:
+            for fixture, runs in fixtures.items():
+                with tempfile.TemporaryDirectory() as tmp:
+                    input_dir = Path(tmp) / "runs"
+                    write_runs(runs, input_dir)
+                    for name, lang in cli_batch_cases:
+                        args = [str(input_dir), "-o", str(Path(tmp) / name), "-l", lang, "-d", "-j", "1", "--force"]
+                        seconds, peak = measure(lambda: json_to_markdown.main.main(args, standalone_mode=False), repeat)
+                        record(result_entry(name, fixture, runs, seconds, peak))
+        finally:
+            json_to_markdown.console.quiet = False
+    
+    if name_filter in "cli_export" or name_filter in "load_corpus":
+        # コーパスの列指向テーブルへの書き出しと、書き出したテーブルの一括読み込み
+        json_to_markdown.console.quiet = True
+        try:
+            for fixture, runs in fixtures.items():
+                with tempfile.TemporaryDirectory() as tmp:
+                    input_dir = Path(tmp) / "runs"
+                    corpus_dir = Path(tmp) / "corpus"
+                    write_runs(runs, input_dir)
+                    args = ["export", str(input_dir), "-o", str(corpus_dir)]
+                    seconds, peak = measure(lambda: json_to_markdown.main.main(args, standalone_mode=False), repeat)
+                    record(result_entry("cli_export", fixture, runs, seconds, peak))
+                    seconds, peak = measure(lambda: load_table(corpus_dir / "floors"), repeat)
+                    record(result_entry("load_corpus", fixture, runs, seconds, peak))
+        finally:
+            json_to_markdown.console.quiet = False
+    
+    startup = {}
+    if name_filter in "import_time":
+        # モジュールの読み込み時間（起動のたびにかかる固定のコスト）
+        for module in ("json_to_markdown", "translations", "translation_table"):
+            total, self_times = import_times(module, repeat)
+            slowest = sorted(self_times.items(), key=lambda item: -item[1])[:10]
+            startup[f"import_time:{module}"] = {
+                "microseconds": total,
+                "self_microseconds": self_times[module],
+                "slowest_self_microseconds": dict(slowest),
+            }
+            click.echo(f"{'import_time':<32} {module:<20} {total / 1000:10.2f} ms (self {self_times[module] / 1000:.2f} ms)")
+    
+    if name_filter in "cli_cold_start":
+        # CLIの起動から終了まで（--help と1ファイルの変換）
+        first_run = min((REPO_ROOT / "runs").rglob("*.run"))
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = Path(tmp) / first_run.parent.name
+            input_dir.mkdir()
+            (input_dir / first_run.name).write_bytes(first_run.read_bytes())
+            cases = {
+                "help": ["--help"],
+                "one_file": [str(input_dir), "-o", str(Path(tmp) / "output"), "-l", "ja", "-d", "-j", "1", "--force"],
+            }
+            for case, args in cases.items():
+                seconds = cold_start_seconds(args, repeat)
+                startup[f"cli_cold_start:{case}"] = {"seconds": seconds}
+                click.echo(f"{'cli_cold_start':<32} {case:<20} {seconds * 1000:10.2f} ms")
+    
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+        "scaling": scaling_report(results),
+        "startup": startup,
+        "translation_cache": cache_info(),
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    click.echo(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
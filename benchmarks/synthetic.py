@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""ベンチマーク用の合成ランデータ生成
+
+通常の55階層のランから、数千階層・大きなデッキのエンドレスランまで、
+STSRunParser が読むフィールドを揃えた .run 形式のデータを生成する。
+"""
+import json
+import random
+import uuid
+from pathlib import Path
+
+import click
+
+# 1章分の部屋の並び（15部屋 + ボス + ボス宝箱）
+ACT_PATH = ["M", "?", "M", "$", "E", "R", "M", "?", "T", "M", "E", "?", "R", "$", "R", "B", None]
+
+CHARACTERS = {
+    "IRONCLAD": {
+        "starter_deck": ["Strike_R"] * 5 + ["Defend_R"] * 4 + ["Bash", "AscendersBane"],
+        "starter_relic": "Burning Blood",
+        "cards": [
+            "Anger", "Armaments", "Bloodletting", "Carnage", "Clothesline", "Dark Embrace", "Demon Form",
+            "Feed", "Flame Barrier", "Headbutt", "Hemokinesis", "Inflame", "Metallicize", "Offering",
+            "Pommel Strike", "Power Through", "Shrug It Off", "Sword Boomerang", "Uppercut", "Whirlwind",
+        ],
+    },
+    "THE_SILENT": {
+        "starter_deck": ["Strike_G"] * 5 + ["Defend_G"] * 5 + ["Neutralize", "Survivor", "AscendersBane"],
+        "starter_relic": "Ring of the Snake",
+        "cards": [
+            "Acrobatics", "After Image", "Backflip", "Blade Dance", "Bouncing Flask", "Burst", "Caltrops",
+            "Catalyst", "Cloak And Dagger", "Crippling Poison", "Dagger Spray", "Deflect", "Envenom",
+            "Footwork", "Noxious Fumes", "Poisoned Stab", "Prepared", "Skewer", "Well Laid Plans", "Wraith Form v2",
+        ],
+    },
+}
+
+RELICS = [
+    "Anchor", "Art of War", "Bag of Marbles", "Bronze Scales", "Centennial Puzzle", "CeramicFish", "Happy Flower",
+    "HornCleat", "Kunai", "Lantern", "Meat on the Bone", "Nunchaku", "Oddly Smooth Stone", "Orichalcum",
+    "Pantograph", "Pen Nib", "Potion Belt", "Shuriken", "Strawberry", "Vajra",
+]
+
+POTIONS = [
+    "AttackPotion", "Block Potion", "BloodPotion", "DistilledChaos", "Energy Potion", "EssenceOfSteel",
+    "Explosive Potion", "FearPotion", "Fire Potion", "GhostInAJar", "PowerPotion", "SkillPotion",
+    "SpeedPotion", "Strength Potion", "Swift Potion", "WeakPotion",
+]
+
+ENEMIES = {
+    "M": ["Jaw Worm", "Cultist", "2 Louse", "Looter", "Exordium Wildlife"],
+    "E": ["Gremlin Nob", "Lagavulin", "3 Sentries"],
+    "B": ["Hexaghost", "Slime Boss", "The Guardian"],
+}
+
+EVENTS = ["The Cleric", "Living Wall", "Golden Wing", "Big Fish", "World of Goop", "Shining Light", "Golden Shrine"]
+
+def generate_run(floors=55, deck_size=30, seed=0, character="THE_SILENT"):
+    """合成ランデータを生成（floors 階層、デッキが deck_size 枚程度になるまでカードを取得）"""
+    rng = random.Random(seed)
+    spec = CHARACTERS[character]
+    deck = list(spec["starter_deck"])
+    relics = [spec["starter_relic"]]
+    potions = []
+    potion_slots = 2
+    gold, hp, max_hp = 99, 70, 70
+    
+    run = {
+        "character_chosen": character,
+        "seed_played": str(rng.getrandbits(63)),
+        "play_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "timestamp": 1700000000 + seed,
+        "ascension_level": rng.randint(0, 20),
+        "is_endless": floors > 57,
+        "neow_bonus": "THREE_ENEMY_KILL",
+        "neow_cost": "NONE",
+        "neow_bonus_log": {"cardsObtained": [], "cardsUpgraded": [], "cardsRemoved": [], "relicsObtained": ["NeowsBlessing"]},
+        "neow_bonuses_skipped_log": ["THREE_CARDS", "ONE_RARE_RELIC", "BOSS_RELIC"],
+        "neow_costs_skipped_log": ["NONE", "NO_GOLD", "NONE"],
+        "path_per_floor": [],
+        "path_taken": [],
+        "gold_per_floor": [],
+        "current_hp_per_floor": [],
+        "max_hp_per_floor": [],
+        "floor_exit_playtime": [],
+        "potion_use_per_floor": [],
+        "potion_discard_per_floor": [],
+        "potions_obtained_alchemize": [],
+        "potions_obtained_entropic_brew": [],
+        "lesson_learned_per_floor": [],
+        "potions_obtained": [],
+        "card_choices": [],
+        "relics_obtained": [],
+        "damage_taken": [],
+        "campfire_choices": [],
+        "shop_contents": [],
+        "event_choices": [],
+        "items_purchased": [],
+        "item_purchase_floors": [],
+        "items_purged": [],
+        "items_purged_floors": [],
+        "improvable_cards": {},
+        "relic_stats": {},
+    }
+    
+    playtime = 0
+    for floor in range(1, floors + 1):
+        room = ACT_PATH[(floor - 1) % len(ACT_PATH)]
+        used, discarded = [], []
+        
+        if room in ("M", "E", "B"):
+            enemies = rng.choice(ENEMIES[room])
+            damage = rng.randint(0, 25)
+            hp = max(1, hp - damage)
+            run["damage_taken"].append({"damage": damage, "enemies": enemies, "floor": floor, "turns": rng.randint(1, 12)})
+            if potions and rng.random() < 0.3:
+                used.append(potions.pop(rng.randrange(len(potions))))
+            gold += rng.randint(10, 30)
+            
+            choices = rng.sample(spec["cards"], 3)
+            if len(deck) < deck_size:
+                picked = choices.pop(rng.randrange(3))
+                deck.append(picked)
+            else:
+                picked = "SKIP"
+            run["card_choices"].append({"floor": floor, "picked": picked, "not_picked": choices})
+            
+            if rng.random() < 0.4:
+                potion = rng.choice(POTIONS)
+                if len(potions) >= potion_slots:
+                    discarded.append(potions.pop(0))
+                potions.append(potion)
+                run["potions_obtained"].append({"floor": floor, "key": potion})
+            if room == "E":
+                relic = rng.choice(RELICS)
+                relics.append(relic)
+                run["relics_obtained"].append({"floor": floor, "key": relic})
+        elif room == "$":
+            shop_cards = rng.sample(spec["cards"], 6)
+            shop_relics = rng.sample(RELICS, 3)
+            shop_potions = rng.sample(POTIONS, 3)
+            bought_card = shop_cards.pop()
+            deck.append(bought_card)
+            run["items_purchased"].append(bought_card)
+            run["item_purchase_floors"].append(floor)
+            if rng.random() < 0.3:
+                bought_relic = shop_relics.pop()
+                relics.append(bought_relic)
+                if bought_relic == "Potion Belt":
+                    potion_slots = 4
+                run["items_purchased"].append(bought_relic)
+                run["item_purchase_floors"].append(floor)
+            # ショップの記録は売れ残りのみ
+            run["shop_contents"].append({"floor": floor, "cards": shop_cards, "relics": shop_relics, "potions": shop_potions})
+            if len(deck) > 10 and rng.random() < 0.5:
+                purged = deck.pop(rng.randrange(len(deck)))
+                run["items_purged"].append(purged)
+                run["items_purged_floors"].append(floor)
+            gold = max(0, gold - rng.randint(50, 150))
+        elif room == "R":
+            upgradable = [card for card in deck if "+" not in card]
+            if upgradable and rng.random() < 0.7:
+                card = rng.choice(upgradable)
+                deck[deck.index(card)] = card + "+1"
+                run["campfire_choices"].append({"floor": floor, "key": "SMITH", "data": card})
+            else:
+                hp = min(max_hp, hp + max_hp * 3 // 10)
+                run["campfire_choices"].append({"floor": floor, "key": "REST"})
+        elif room == "?":
+            event = {"event_name": rng.choice(EVENTS), "player_choice": "Chosen", "floor": floor, "damage_taken": 0, "gold_gain": 0}
+            if len(deck) > 10 and rng.random() < 0.3:
+                removed = deck.pop(rng.randrange(len(deck)))
+                event["cards_removed"] = [removed.split("+")[0]]
+            run["event_choices"].append(event)
+        elif room == "T":
+            relic = rng.choice(RELICS)
+            relics.append(relic)
+            run["relics_obtained"].append({"floor": floor, "key": relic})
+        
+        if room == "B":
+            max_hp += 5
+            hp = max_hp
+        
+        playtime += rng.randint(10, 120)
+        run["path_per_floor"].append(room)
+        run["path_taken"].append("BOSS" if room == "B" else room)
+        run["gold_per_floor"].append(gold)
+        run["current_hp_per_floor"].append(hp)
+        run["max_hp_per_floor"].append(max_hp)
+        run["floor_exit_playtime"].append(playtime)
+        run["potion_use_per_floor"].append(used)
+        run["potion_discard_per_floor"].append(discarded)
+        run["potions_obtained_alchemize"].append([])
+        run["potions_obtained_entropic_brew"].append([])
+        run["lesson_learned_per_floor"].append([])
+    
+    run.update({
+        "floor_reached": floors,
+        "victory": False,
+        "killed_by": rng.choice(ENEMIES["B"]),
+        "score": floors * 5 + len(relics) * 10,
+        "playtime": playtime,
+        "gold": gold,
+        "master_deck": deck,
+        "relics": relics,
+        "purchased_purges": len(run["items_purged"]),
+        "score_breakdown": [f"Floors Climbed ({floors}): {floors * 5}"],
+        "basemod:card_modifiers": [None] * len(deck),
+    })
+    return run
+
+@click.command()
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--count', '-n', default=10, type=click.IntRange(min=1), help='Number of runs to generate')
+@click.option('--floors', default=55, type=click.IntRange(min=1), help='Floors per run')
+@click.option('--deck-size', default=30, type=click.IntRange(min=1), help='Target deck size')
+@click.option('--seed', default=0, type=int, help='Random seed of the first run')
+@click.option('--character', default='THE_SILENT', type=click.Choice(sorted(CHARACTERS)), help='Character')
+def main(output_dir, count, floors, deck_size, seed, character):
+    """Write synthetic .run files to OUTPUT_DIR/<character>/."""
+    char_output_path = Path(output_dir) / character
+    char_output_path.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        run = generate_run(floors, deck_size, seed + i, character)
+        with open(char_output_path / f"{run['timestamp']}.run", 'w', encoding='utf-8') as f:
+            json.dump(run, f)
+    click.echo(f"{count} runs ({floors} floors) written to {char_output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""ランデータのコーパスを列指向のテーブルとして書き出す
+
+ランごとのヘッダー（runs）と階層ごとのデータ（floors）の2つのテーブルを作成する。
+columns 形式ではテーブルごとのディレクトリに列ごとの int32 配列ファイル（.i32）と schema.json を置く。
+文字列の列は辞書エンコードし、値の一覧を schema.json に、コードを .i32 に保存する。
+.i32 はヘッダーのない生の配列なので、numpy.memmap などでそのままメモリマップできる。
+"""
+import csv
+import json
+import sys
+from array import array
+from pathlib import Path
+
+SCHEMA_NAME = "schema.json"
+SCHEMA_VERSION = 1
+# int32 列の欠損値
+NULL = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+# テーブル名 -> [(列名, 型)]（型は int32 または string）
+RUN_COLUMNS = [
+    ("run", "int32"),
+    ("file", "string"),
+    ("character", "string"),
+    ("seed", "string"),
+    ("ascension_level", "int32"),
+    ("floor_reached", "int32"),
+    ("victory", "int32"),
+    ("killed_by", "string"),
+    ("score", "int32"),
+    ("playtime", "int32"),
+    ("neow_bonus", "string"),
+    ("neow_cost", "string"),
+    ("deck_size", "int32"),
+    ("relic_count", "int32"),
+]
+
+FLOOR_COLUMNS = [
+    ("run", "int32"),
+    ("floor", "int32"),
+    ("path", "string"),
+    ("gold", "int32"),
+    ("current_hp", "int32"),
+    ("max_hp", "int32"),
+    ("damage", "int32"),
+    ("turns", "int32"),
+    ("enemies", "string"),
+    ("picked", "string"),
+    ("not_picked", "string"),
+    ("relics_obtained", "string"),
+    ("potions_obtained", "string"),
+    ("campfire", "string"),
+    ("campfire_card", "string"),
+    ("event", "string"),
+    ("event_choice", "string"),
+    ("purchased", "string"),
+    ("purged", "string"),
+]
+
+TABLES = {"runs": RUN_COLUMNS, "floors": FLOOR_COLUMNS}
+
+# 複数の値を持つ列の区切り文字
+LIST_SEPARATOR = "|"
+
+def _join(values):
+    return LIST_SEPARATOR.join(str(value) for value in values) if values else None
+
+def run_row(run_id, file_name, parser):
+    """ランのヘッダー行"""
+    run = parser.run
+    return (
+        run_id,
+        file_name,
+        run.character_chosen,
+        run.seed_played,
+        run.ascension_level,
+        run.floor_reached,
+        bool(run.victory),
+        None if run.victory else run.killed_by,
+        run.score,
+        run.playtime,
+        run.neow_bonus,
+        run.neow_cost,
+        len(run.master_deck),
+        len(run.relics),
+    )
+
+def floor_rows(run_id, parser):
+    """get_floor_data から階層ごとの行を順に返す"""
+    for floor in range(1, parser.run.floor_reached + 1):
+        floor_data = parser.get_floor_data(floor)
+        damage = floor_data["damage_taken"]
+        card_choice = floor_data["cards_obtained"]
+        campfire = floor_data["campfire_choices"]
+        event = floor_data["event_choices"]
+        purchases = floor_data["shop_purchases"]
+        yield (
+            run_id,
+            floor,
+            floor_data["path"],
+            floor_data["gold"],
+            floor_data["current_hp"],
+            floor_data["max_hp"],
+            damage.damage if damage else None,
+            damage.turns if damage else None,
+            damage.enemies if damage else None,
+            (card_choice.picked or None) if card_choice else None,
+            _join(card_choice.not_picked) if card_choice else None,
+            _join(floor_data["relics_obtained"]),
+            _join(floor_data["potions_obtained"]),
+            campfire.action if campfire else None,
+            campfire.data if campfire else None,
+            event.event_name if event else None,
+            event.player_choice if event else None,
+            _join([purchase["item"] for purchase in purchases if purchase["type"] == "purchase"]),
+            _join([purchase["item"] for purchase in purchases if purchase["type"] == "purge"]),
+        )
+
+def _to_int32(value):
+    # ダメージなどは 0.0 のように小数で記録されることがある
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int) and -INT32_MAX <= value <= INT32_MAX:
+        return int(value)
+    return NULL
+
+class ColumnarTableWriter:
+    """列ごとの .i32 ファイルにテーブルを追記し、close 時に schema.json を書き出す"""
+    
+    def __init__(self, directory, columns, flush_rows=65536):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        self.flush_rows = flush_rows
+        self.rows = 0
+        self._files = [open(self.directory / f"{name}.i32", 'wb') for name, _ in columns]
+        self._buffers = [array('i') for _ in columns]
+        # 文字列の列の辞書（値 -> コード）
+        self._dictionaries = [{} if column_type == "string" else None for _, column_type in columns]
+    
+    def write_rows(self, rows):
+        buffers = self._buffers
+        dictionaries = self._dictionaries
+        for row in rows:
+            for buffer, dictionary, value in zip(buffers, dictionaries, row):
+                if dictionary is None:
+                    buffer.append(_to_int32(value))
+                elif value is None:
+                    buffer.append(-1)
+                else:
+                    value = str(value)
+                    code = dictionary.get(value)
+                    if code is None:
+                        code = dictionary[value] = len(dictionary)
+                    buffer.append(code)
+            self.rows += 1
+            if len(buffers[0]) >= self.flush_rows:
+                self._flush()
+    
+    def _flush(self):
+        for f, buffer in zip(self._files, self._buffers):
+            if sys.byteorder != "little":
+                buffer.byteswap()
+            buffer.tofile(f)
+            del buffer[:]
+    
+    def close(self):
+        self._flush()
+        for f in self._files:
+            f.close()
+        schema = {
+            "version": SCHEMA_VERSION,
+            "rows": self.rows,
+            "byteorder": "little",
+            "null": NULL,
+            "columns": [
+                {"name": name, "type": column_type, "file": f"{name}.i32"}
+                | ({"values": list(dictionary)} if dictionary is not None else {})
+                for (name, column_type), dictionary in zip(self.columns, self._dictionaries)
+            ],
+        }
+        with open(self.directory / SCHEMA_NAME, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+
+class CsvTableWriter:
+    """テーブルをヘッダー付きのCSVとして書き出す（欠損値は空文字列）"""
+    
+    def __init__(self, path, columns):
+        self.rows = 0
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+    
+    def write_rows(self, rows):
+        for row in rows:
+            self._writer.writerow([int(value) if isinstance(value, bool) else value for value in row])
+            self.rows += 1
+    
+    def close(self):
+        self._file.close()
+
+def open_table_writers(output_path, table_format):
+    """runs・floors テーブルのライターを作成"""
+    output_path = Path(output_path)
+    output_path.mkdir(parents=True, exist_ok=True)
+    if table_format == "csv":
+        return {name: CsvTableWriter(output_path / f"{name}.csv", columns) for name, columns in TABLES.items()}
+    return {name: ColumnarTableWriter(output_path / name, columns) for name, columns in TABLES.items()}
+
+def load_table(directory, decode_strings=True):
+    """columns 形式のテーブルを列名 -> 値の配列の dict として一括で読み込む
+    
+    decode_strings が偽の場合、文字列の列は辞書のコード（欠損値は -1）のまま返す。
+    """
+    directory = Path(directory)
+    with open(directory / SCHEMA_NAME, encoding='utf-8') as f:
+        schema = json.load(f)
+    
+    table = {}
+    for column in schema["columns"]:
+        values = array('i')
+        with open(directory / column["file"], 'rb') as f:
+            values.fromfile(f, schema["rows"])
+        if sys.byteorder != schema["byteorder"]:
+            values.byteswap()
+        if column["type"] == "string" and decode_strings:
+            dictionary = column["values"]
+            values = [dictionary[code] if code >= 0 else None for code in values]
+        table[column["name"]] = values
+    return table
@@ -1,35 +1,212 @@
 #!/usr/bin/env python3
+import copy
+import hashlib
 import json
+import os
+import time
+from bisect import bisect_right
+from collections import Counter
+from contextlib import contextmanager, nullcontext
 import click
 from pathlib import Path
-from rich import print
-from rich.console import Console
-from rich.table import Table
-from translations import translate, translate_list
+from output_writer import encode_chunks, iter_encoded_chunks, write_if_changed
+from run_loader import decode_run
+from run_model import RunModel
+from run_stats import STATS_FIELDS, RunStats
+from translation_table import translate, translate_list, cache_info as translation_cache_info, fingerprint as translation_fingerprint
+# rich・asyncio（パイプライン）・sqlite3（インデックス）などの読み込みに時間のかかるモジュールは、
+# --help や1ファイルの変換の起動を遅くしないよう、使う処理の中で読み込む
 
-console = Console()
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 1
+# 出力できる言語（--lang all で出力する順）
+LANGUAGES = ("en", "ja")
+
+class _DeferredConsole:
+    """最初に使われた時点で rich の Console を作成する"""
+    
+    def __init__(self):
+        object.__setattr__(self, "_console", None)
+    
+    def _get(self):
+        if self._console is None:
+            from rich.console import Console
+            object.__setattr__(self, "_console", Console())
+        return self._console
+    
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+console = _DeferredConsole()
+
+# 出力する行のテンプレート（%(キー)s は言語ごとに一度だけ翻訳して埋め込む固定のラベル、{} は描画時に埋め込む値）
+LINE_TEMPLATES = {
+    "title": "# Slay the Spire Run - {}",
+    "seed": "**%(seed)s**: {}",
+    "ascension_level": "**%(ascension_level)s**: {}",
+    "floor_reached": "**%(floor_reached)s**: {}",
+    "victory_yes": "**%(victory)s**: %(yes)s",
+    "victory_no": "**%(victory)s**: %(no)s",
+    "killed_by": "**%(killed_by)s**: {}",
+    "score": "**%(score)s**: {}",
+    "playtime": "**%(playtime)s**: {} %(seconds)s",
+    "final_deck": "## %(final_deck)s",
+    "final_relics": "## %(final_relics)s",
+    "floor_details": "## %(floor_details)s",
+    "neow_bonus": "### %(neow_bonus)s",
+    "bonus": "- **%(bonus)s**: {}",
+    "cost": "- **%(cost)s**: {}",
+    "floor": "### %(floor)s {} - {}",
+    "deck_count": "- **%(current_deck)s**: {} %(card_count)s",
+    "deck_details": "- **%(current_deck)s** ({} %(card_count)s): {}",
+    "deck_summary": "<details><summary>%(current_deck)s ({} %(card_count)s)</summary>",
+    "current_relics": "- **%(current_relics)s**: {}",
+    "current_potions": "- **%(current_potions)s**: {}",
+    "hp": "- **%(hp)s**: {}{}/{}{}",
+    "gold": "- **%(gold)s**: {}{}",
+    "combat": "- **%(combat)s**: {} (%(damage)s: {}, %(turns)s: {})",
+    "card_choice": "- **%(card_choice)s**: {}",
+    "relic_obtained": "- **%(relic_obtained)s**: {}",
+    "potion_obtained": "- **%(potion_obtained)s**: {}",
+    "campfire": "- **%(campfire)s**: {}",
+    "campfire_data": "- **%(campfire)s**: {} ({})",
+    "shop": "- **%(shop)s**:",
+    "shop_cards": "  - %(cards)s: {}",
+    "shop_relics": "  - %(relics)s: {}",
+    "shop_potions": "  - %(potions)s: {}",
+    "shop_purchases": "  - %(shop_purchases)s: {}",
+    "purchased": "%(purchased)s: {}",
+    "purged": "%(purged)s: {}",
+    "event": "- **%(event)s**: {} - {}",
+}
+
+class _TranslatedLabels:
+    """テンプレートに埋め込むラベル（str.format の書式と解釈されないよう波括弧をエスケープ）"""
+    
+    def __init__(self, lang):
+        self.lang = lang
+    
+    def __getitem__(self, key):
+        return translate(key, self.lang).replace("{", "{{").replace("}", "}}")
+
+class LabelTemplates:
+    """固定のラベルを翻訳済みの行のテンプレート（属性名は LINE_TEMPLATES のキー）"""
+    
+    _cache = {}
+    
+    def __init__(self, lang):
+        labels = _TranslatedLabels(lang)
+        for name, template in LINE_TEMPLATES.items():
+            setattr(self, name, template % labels)
+    
+    @classmethod
+    def for_lang(cls, lang):
+        """言語ごとのテンプレート（プロセス内で一度だけ作成）"""
+        templates = cls._cache.get(lang)
+        if templates is None:
+            templates = cls._cache[lang] = cls(lang)
+        return templates
 
 class STSRunParser:
-    def __init__(self, json_data, lang="en", show_deck_details=False):
-        self.data = json_data
+    # --profile で計測するメソッド -> 段階
+    PROFILED_METHODS = {
+        "__init__": "parser",
+        "get_floor_data": "floor_data",
+        "_build_deck_changes": "deck",
+        "_get_deck_at_floor": "deck",
+        "_build_relic_timeline": "relics",
+        "_get_relics_at_floor": "relics",
+        "_get_potions_at_floor": "potions",
+    }
+    # ジェネレーターは要素の生成ごとに計測する
+    PROFILED_GENERATORS = {
+        "_iter_deck_states": "deck",
+        "_iter_deck_displays": "deck",
+        "_iter_potion_states": "potions",
+        "iter_markdown": "render",
+    }
+    
+    # 出力するセクション（header: ランの情報, final: 最終デッキ・レリック, neow: Neowボーナス, それ以外は各階層の項目）
+    SECTIONS = (
+        "header", "final", "neow", "deck", "relics", "potions", "hp", "gold", "combat", "rewards", "campfire", "shop", "event",
+    )
+    FLOOR_SECTIONS = frozenset(SECTIONS[3:])
+    # デッキの詳細の形式（full: 毎階層すべてのカード, delta: ランの開始時と各層の開始時のみすべてのカード、それ以外は変更のみ）
+    DECK_FORMATS = ("full", "delta")
+    
+    def __init__(self, json_data, lang="en", show_deck_details=False, floors=None, sections=None,
+                 deck_format="full", deck_snapshot_interval=0):
+        """floors は出力する階層の範囲 (開始, 終了)（None は制限なし、階層0はNeowボーナス）、sections は出力するセクション（None はすべて）
+        
+        deck_format が delta の場合、deck_snapshot_interval 階層ごと（0 は無効）に折りたたみ可能なデッキ全体も出力する。
+        """
+        # dict のランデータはコンパクトなモデルに変換してから扱う
+        self.run = json_data if isinstance(json_data, RunModel) else RunModel.from_dict(json_data)
         self.lang = lang
+        self.templates = LabelTemplates.for_lang(lang)
         self.show_deck_details = show_deck_details
+        self.floors = floors
+        self.sections = frozenset(self.SECTIONS if sections is None else sections)
+        if deck_format not in self.DECK_FORMATS:
+            raise ValueError(f"unknown deck_format: {deck_format}")
+        self.deck_format = deck_format
+        self.deck_snapshot_interval = deck_snapshot_interval
         self.initial_deck = self._get_initial_deck()
         self.initial_relics = self._get_initial_relics()
+        self._build_floor_index()
+        self._shop_item_types = self._classify_shop_items()
+        self._build_relic_timeline()
+        # 言語に依存しない再生結果（with_lang で作成したパーサーと共有する）
+        self._replay_cache = {}
+        self._floor_data_cache = None
+    
+    def with_lang(self, lang):
+        """ランデータ・階層ごとの再生結果を共有し、別の言語で出力するパーサーを作成
+        
+        共有した再生結果は最初に出力したパーサーで計算され、以降の言語では翻訳と整形のみ行う。
+        """
+        if self._floor_data_cache is None:
+            # 複数の言語で出力する場合のみ階層ごとのデータを保持する
+            self._floor_data_cache = {}
+        parser = copy.copy(self)
+        parser.lang = lang
+        parser.templates = LabelTemplates.for_lang(lang)
+        return parser
+    
+    @classmethod
+    def profiled(cls, profiler):
+        """各段階の時間を profiler で計測するサブクラスを作成（通常の変換ではこのクラスをそのまま使うため計測のコストはない）"""
+        namespace = {name: profiler.wrap(getattr(cls, name), phase) for name, phase in cls.PROFILED_METHODS.items()}
+        namespace.update(
+            (name, profiler.wrap_generator(getattr(cls, name), phase)) for name, phase in cls.PROFILED_GENERATORS.items()
+        )
+        init = namespace["__init__"]
+        
+        def __init__(self, *args, **kwargs):
+            init(self, *args, **kwargs)
+            profiler.set_file_info(floors=self.run.floor_reached)
         
+        namespace["__init__"] = __init__
+        return type(f"Profiled{cls.__name__}", (cls,), namespace)
+    
     def get_floor_data(self, floor):
         floor_index = floor - 1
         prev_floor_index = floor_index - 1 if floor_index > 0 else None
         
+        run = self.run
+        
         floor_data = {
             "floor": floor,
-            "path": self._safe_get_list("path_per_floor", floor_index),
-            "gold": self._safe_get_list("gold_per_floor", floor_index),
-            "gold_prev": self._safe_get_list("gold_per_floor", prev_floor_index) if prev_floor_index is not None else None,
-            "current_hp": self._safe_get_list("current_hp_per_floor", floor_index),
-            "current_hp_prev": self._safe_get_list("current_hp_per_floor", prev_floor_index) if prev_floor_index is not None else None,
-            "max_hp": self._safe_get_list("max_hp_per_floor", floor_index),
-            "max_hp_prev": self._safe_get_list("max_hp_per_floor", prev_floor_index) if prev_floor_index is not None else None,
+            "path": self._safe_get_list(run.path_per_floor, floor_index),
+            "gold": self._safe_get_list(run.gold_per_floor, floor_index),
+            "gold_prev": self._safe_get_list(run.gold_per_floor, prev_floor_index),
+            "current_hp": self._safe_get_list(run.current_hp_per_floor, floor_index),
+            "current_hp_prev": self._safe_get_list(run.current_hp_per_floor, prev_floor_index),
+            "max_hp": self._safe_get_list(run.max_hp_per_floor, floor_index),
+            "max_hp_prev": self._safe_get_list(run.max_hp_per_floor, prev_floor_index),
             "potions_obtained": self._get_potions_for_floor(floor),
             "cards_obtained": self._get_cards_for_floor(floor),
             "relics_obtained": self._get_relics_for_floor(floor),
@@ -42,97 +219,104 @@ class STSRunParser:
         
         return floor_data
     
-    def _safe_get_list(self, key, index):
-        lst = self.data.get(key, [])
+    def _cached_floor_data(self, floor):
+        """階層ごとのデータ（with_lang で別の言語のパーサーを作成した場合は共有して一度だけ作成）"""
+        cache = self._floor_data_cache
+        if cache is None:
+            return self.get_floor_data(floor)
+        floor_data = cache.get(floor)
+        if floor_data is None:
+            floor_data = cache[floor] = self.get_floor_data(floor)
+        return floor_data
+    
+    def _safe_get_list(self, lst, index):
         if index is not None and index < len(lst):
             return lst[index]
         return None
     
+    def _build_floor_index(self):
+        """階層ごとのイベントを一度の走査でインデックス化"""
+        run = self.run
+        
+        self._potions_by_floor = {}
+        for potion in run.potions_obtained:
+            self._potions_by_floor.setdefault(potion.floor, []).append(potion.key)
+        
+        self._relics_by_floor = {}
+        for relic in run.relics_obtained:
+            self._relics_by_floor.setdefault(relic.floor, []).append(relic.key)
+        
+        # 同じ階層に複数ある場合は最初のものを採用
+        self._cards_by_floor = {}
+        for choice in run.card_choices:
+            self._cards_by_floor.setdefault(choice.floor, choice)
+        
+        self._damage_by_floor = {}
+        for damage in run.damage_taken:
+            self._damage_by_floor.setdefault(damage.floor, damage)
+        
+        self._campfire_by_floor = {}
+        for choice in run.campfire_choices:
+            self._campfire_by_floor.setdefault(choice.floor, choice)
+        
+        self._shop_by_floor = {}
+        for shop in run.shop_contents:
+            self._shop_by_floor.setdefault(shop.floor, shop)
+        
+        self._event_by_floor = {}
+        for event in run.event_choices:
+            self._event_by_floor.setdefault(event.floor, event)
+        
+        # ショップでの購入・パージ行動
+        self._shop_purchases_by_floor = {}
+        items_purchased = run.items_purchased
+        for i, purchase_floor in enumerate(run.item_purchase_floors):
+            if i < len(items_purchased):
+                self._shop_purchases_by_floor.setdefault(purchase_floor, []).append({
+                    "type": "purchase",
+                    "item": items_purchased[i]
+                })
+        
+        # パージは階層ごとに items_purged の先頭から対応付ける
+        items_purged = run.items_purged
+        purge_counts = {}
+        for purge_floor in run.items_purged_floors:
+            purge_count = purge_counts.get(purge_floor, 0)
+            if purge_count < len(items_purged):
+                item = items_purged[purge_count]
+            else:
+                item = "Unknown Card"
+            self._shop_purchases_by_floor.setdefault(purge_floor, []).append({
+                "type": "purge",
+                "item": item
+            })
+            purge_counts[purge_floor] = purge_count + 1
+    
     def _get_potions_for_floor(self, floor):
-        potions = []
-        for potion in self.data.get("potions_obtained", []):
-            if potion.get("floor") == floor:
-                potions.append(potion.get("key"))
-        return potions
+        return list(self._potions_by_floor.get(floor, []))
     
     def _get_cards_for_floor(self, floor):
-        for choice in self.data.get("card_choices", []):
-            if choice.get("floor") == floor:
-                return choice
-        return None
+        return self._cards_by_floor.get(floor)
     
     def _get_relics_for_floor(self, floor):
-        relics = []
-        for relic in self.data.get("relics_obtained", []):
-            if relic.get("floor") == floor:
-                relics.append(relic.get("key"))
-        return relics
+        return list(self._relics_by_floor.get(floor, []))
     
     def _get_damage_for_floor(self, floor):
-        for damage in self.data.get("damage_taken", []):
-            if damage.get("floor") == floor:
-                return {
-                    "enemies": damage.get("enemies"),
-                    "damage": damage.get("damage"),
-                    "turns": damage.get("turns")
-                }
-        return None
+        return self._damage_by_floor.get(floor)
     
     def _get_campfire_for_floor(self, floor):
-        for choice in self.data.get("campfire_choices", []):
-            if choice.get("floor") == floor:
-                return {
-                    "action": choice.get("key"),
-                    "data": choice.get("data")
-                }
-        return None
+        return self._campfire_by_floor.get(floor)
     
     def _get_shop_for_floor(self, floor):
-        for shop in self.data.get("shop_contents", []):
-            if shop.get("floor") == floor:
-                return shop
-        return None
+        return self._shop_by_floor.get(floor)
     
     def _get_shop_purchases_for_floor(self, floor):
         """ショップでの購入・パージ行動を取得"""
-        purchases = []
-        
-        # アイテム購入
-        items_purchased = self.data.get("items_purchased", [])
-        item_purchase_floors = self.data.get("item_purchase_floors", [])
-        
-        for i, purchase_floor in enumerate(item_purchase_floors):
-            if purchase_floor == floor and i < len(items_purchased):
-                purchases.append({
-                    "type": "purchase",
-                    "item": items_purchased[i]
-                })
-        
-        # カードパージ
-        purchased_purges = self.data.get("purchased_purges", 0)
-        items_purged_floors = self.data.get("items_purged_floors", [])
-        items_purged = self.data.get("items_purged", [])
-        
-        purge_count = 0
-        for purge_floor in items_purged_floors:
-            if purge_floor == floor:
-                if purge_count < len(items_purged):
-                    purchases.append({
-                        "type": "purge",
-                        "item": items_purged[purge_count]
-                    })
-                else:
-                    purchases.append({
-                        "type": "purge",
-                        "item": "Unknown Card"
-                    })
-                purge_count += 1
-        
-        return purchases
+        return list(self._shop_purchases_by_floor.get(floor, []))
     
     def _get_initial_deck(self):
         """初期デッキを取得"""
-        character = self.data.get('character_chosen', 'IRONCLAD')
+        character = self.run.character_chosen or 'IRONCLAD'
         
         # 基本的な初期デッキ
         if character == 'IRONCLAD':
@@ -148,7 +332,7 @@ class STSRunParser:
     
     def _get_initial_relics(self):
         """初期レリックを取得"""
-        character = self.data.get('character_chosen', 'IRONCLAD')
+        character = self.run.character_chosen or 'IRONCLAD'
         
         if character == 'IRONCLAD':
             return ["Burning Blood"]
@@ -163,206 +347,435 @@ class STSRunParser:
     
     def _get_deck_at_floor(self, floor):
         """指定階層でのデッキを取得"""
-        deck = self.initial_deck.copy()
+        deck = Counter(self.initial_deck)
+        for _, deck, _ in self._iter_deck_states(floor):
+            pass
+        return sorted(deck.elements())
+    
+    def _replayed(self, name, last_floor, replay):
+        """言語に依存しない再生結果を (name, last_floor) ごとに一度だけ計算して共有する"""
+        key = (name, last_floor)
+        result = self._replay_cache.get(key)
+        if result is None:
+            result = self._replay_cache[key] = replay(last_floor)
+        return result
+    
+    def _deck_deltas(self, last_floor):
+        """各階層でのデッキへの変更のリスト（階層0から last_floor まで）"""
+        return self._replayed("deck", last_floor, lambda last: [delta for _, _, delta in self._iter_deck_states(last)])
+    
+    def _potion_states(self, last_floor):
+        """各階層終了時点の所持ポーションのリスト（階層0から last_floor まで）"""
+        return self._replayed("potions", last_floor, lambda last: [tuple(potions) for _, potions in self._iter_potion_states(last)])
+    
+    def _build_deck_changes(self, last_floor):
+        """デッキへの変更を階層ごとにまとめる（追加・イベント削除・パージ・強化・イベント強化）"""
+        run = self.run
+        changes = {}
         
-        # Neowボーナスでのカード取得
-        neow_bonus = self.data.get('neow_bonus', '')
+        def floor_changes(floor):
+            if floor not in changes:
+                changes[floor] = ([], [], [], [], [])
+            return changes[floor]
+        
+        # Neowボーナスでのカード取得（階層0のカード選択）
+        neow_bonus = run.neow_bonus
         if 'RANDOM_COLORLESS' in neow_bonus or 'THREE_RARE_CARDS' in neow_bonus:
-            # 階層0のカード選択を確認
-            for choice in self.data.get("card_choices", []):
-                if choice.get("floor") == 0:
-                    picked = choice.get("picked")
-                    if picked and picked != "SKIP":
-                        deck.append(picked)
-                    break
-        
-        # 各階層で取得したカードを追加
-        for choice in self.data.get("card_choices", []):
-            if 0 < choice.get("floor", 999) <= floor:
-                picked = choice.get("picked")
+            neow_choice = self._get_cards_for_floor(0)
+            if neow_choice:
+                picked = neow_choice.picked
                 if picked and picked != "SKIP":
-                    deck.append(picked)
-        
-        # ショップで購入したカードを追加
-        items_purchased = self.data.get("items_purchased", [])
-        item_purchase_floors = self.data.get("item_purchase_floors", [])
-        for i, purchase_floor in enumerate(item_purchase_floors):
-            if purchase_floor <= floor and i < len(items_purchased):
-                item = items_purchased[i]
-                # カードかどうかをチェック（レリックでない場合）
-                if item not in self._get_all_relics_up_to_floor(floor):
-                    deck.append(item)
-        
-        # イベントでのカード変換・取得を考慮
-        for event in self.data.get("event_choices", []):
-            if event.get("floor", 999) <= floor:
-                # カード削除
-                cards_removed = event.get("cards_removed", [])
-                for card in cards_removed:
-                    if card in deck:
-                        deck.remove(card)
-                
-                # カード変換・取得（必要に応じて拡張）
-        
-        # パージしたカードを削除
-        items_purged = self.data.get("items_purged", [])
-        items_purged_floors = self.data.get("items_purged_floors", [])
-        for i, purge_floor in enumerate(items_purged_floors):
-            if purge_floor <= floor and i < len(items_purged):
-                card = items_purged[i]
-                if card in deck:
-                    deck.remove(card)
-        
-        # アップグレードの処理
-        for campfire in self.data.get("campfire_choices", []):
-            if campfire.get("floor", 999) <= floor and campfire.get("key") == "SMITH":
-                card_to_upgrade = campfire.get("data")
-                if card_to_upgrade and card_to_upgrade in deck:
-                    deck[deck.index(card_to_upgrade)] = card_to_upgrade + "+1"
-        
-        # イベントでのアップグレード
-        for event in self.data.get("event_choices", []):
-            if event.get("floor", 999) <= floor:
-                cards_upgraded = event.get("cards_upgraded", [])
-                for card in cards_upgraded:
-                    if card in deck:
-                        deck[deck.index(card)] = card + "+1"
-        
-        return sorted(deck)
+                    floor_changes(0)[0].append(picked)
+        
+        # 各階層で取得したカード
+        for choice in run.card_choices:
+            if choice.floor > 0:
+                picked = choice.picked
+                if picked and picked != "SKIP":
+                    floor_changes(choice.floor)[0].append(picked)
+        
+        # ショップで購入したカード
+        for purchase_floor, card in self._get_purchased_items("card"):
+            floor_changes(purchase_floor)[0].append(card)
+        
+        # イベントでのカード削除・強化
+        for event in run.event_choices:
+            floor_changes(event.floor)[1].extend(event.cards_removed)
+            floor_changes(event.floor)[4].extend(event.cards_upgraded)
+        
+        # パージしたカード
+        items_purged = run.items_purged
+        for i, purge_floor in enumerate(run.items_purged_floors):
+            if i < len(items_purged):
+                floor_changes(purge_floor)[2].append(items_purged[i])
+        
+        # 休憩所でのアップグレード
+        for campfire in run.campfire_choices:
+            if campfire.action == "SMITH" and campfire.data:
+                floor_changes(campfire.floor)[3].append(campfire.data)
+        
+        return changes
+    
+    def _iter_deck_states(self, last_floor):
+        """デッキの変更を階層順に一度だけ適用し、各階層終了時点の (階層, デッキ（枚数付き）, 変更) を順に返す
+        
+        変更はその階層で増減したカードの (カード, +1/-1, 強化による増減か) のリスト。
+        返される Counter は再生中に更新されるため、呼び出し側で変更しないこと。
+        """
+        deck = Counter(self.initial_deck)
+        changes = self._build_deck_changes(last_floor)
+        delta = []
+        
+        def remove(card, upgraded=False):
+            # イベントでの削除は強化前のIDで記録されるため、強化済みのカードも対象にする
+            if card not in deck:
+                card = next((c for c in deck if c.startswith(card + "+")), card)
+            if deck[card] > 1:
+                deck[card] -= 1
+                delta.append((card, -1, upgraded))
+            elif card in deck:
+                del deck[card]
+                delta.append((card, -1, upgraded))
+        
+        def upgrade(card):
+            if card in deck:
+                remove(card, True)
+                deck[card + "+1"] += 1
+                delta.append((card + "+1", 1, True))
+        
+        for floor in range(last_floor + 1):
+            delta = []
+            if floor in changes:
+                added, removed, purged, smithed, event_upgraded = changes[floor]
+                deck.update(added)
+                delta.extend((card, 1, False) for card in added)
+                for card in removed:
+                    remove(card)
+                for card in purged:
+                    remove(card)
+                for card in smithed:
+                    upgrade(card)
+                for card in event_upgraded:
+                    upgrade(card)
+            yield floor, deck, delta
+    
+    def _iter_deck_displays(self, last_floor, display_floors=None):
+        """各階層終了時点のデッキを (枚数, 表示用の文字列, その階層での変更) で順に返す
+        
+        翻訳後のカード名ごとの枚数を階層ごとの変更分だけ更新し、表示用の文字列（名前順、2枚以上は "xN"）は
+        デッキが変わった階層でのみ作り直す。show_deck_details が偽の場合、または display_floors（None はすべての階層）に
+        含まれない階層では、表示用の文字列は None。
+        """
+        lang = self.lang
+        show_details = self.show_deck_details
+        translated_counts = {}
+        total = 0
+        for card in self.initial_deck:
+            name = translate(card, lang)
+            translated_counts[name] = translated_counts.get(name, 0) + 1
+            total += 1
+        display = None
+        changed = True
+        
+        for floor, delta in enumerate(self._deck_deltas(last_floor)):
+            for card, count, _ in delta:
+                name = translate(card, lang)
+                remaining = translated_counts.get(name, 0) + count
+                if remaining:
+                    translated_counts[name] = remaining
+                else:
+                    del translated_counts[name]
+                total += count
+                changed = True
+            if not show_details or display_floors is not None and floor not in display_floors:
+                yield total, None, delta
+                continue
+            if changed:
+                display = ", ".join(
+                    f"{name} x{count}" if count > 1 else name for name, count in sorted(translated_counts.items())
+                )
+                changed = False
+            yield total, display, delta
+    
+    def _deck_delta_text(self, delta):
+        """デッキへの変更を "+カード, -カード, カード→カード+1" の形式で表示"""
+        parts = []
+        for card, count, upgraded in delta:
+            if upgraded:
+                # 強化は強化後のカードの追加としてまとめて表示する（強化前のカードの削除は表示しない）
+                if count > 0:
+                    parts.append(f"{translate(card[:-len('+1')], self.lang)}→{translate(card, self.lang)}")
+            else:
+                parts.append(f"{'+' if count > 0 else '-'}{translate(card, self.lang)}")
+        return ", ".join(parts)
+    
+    def _deck_snapshot_floors(self, first_floor, last_floor):
+        """delta 形式でデッキ全体を出力する階層（出力する最初の階層と、各層の最初の階層）"""
+        path = self.run.path_per_floor
+        # 層の最後（ボス報酬の宝箱）の階層は経路が記録されない
+        return {max(first_floor, 1)} | {
+            floor for floor in range(max(first_floor, 2), last_floor + 1) if floor - 2 < len(path) and path[floor - 2] is None
+        }
+    
+    def _classify_shop_items(self):
+        """ショップで購入したアイテムをカード・レリック・ポーションに分類"""
+        # shop_contents は購入されずに残った商品のみ記録されるため、取得ログも併用する
+        run = self.run
+        relic_names = set(self.initial_relics)
+        relic_names.update(run.relics)
+        relic_names.update(relic.key for relic in run.relics_obtained)
+        potion_names = {potion.key for potion in run.potions_obtained}
+        for potions in run.potion_use_per_floor + run.potion_discard_per_floor:
+            potion_names.update(potions)
+        # カードはデッキ・カード選択・パージ・強化・削除・変化・イベントでの取得のログに現れるもの（強化済みのカードは強化前の名前でも判定する）
+        card_names = set(run.master_deck)
+        card_names.update(run.items_purged)
+        for choice in run.card_choices:
+            card_names.add(choice.picked)
+            card_names.update(choice.not_picked)
+        for event in run.event_choices:
+            card_names.update(event.cards_removed)
+            card_names.update(event.cards_upgraded)
+            card_names.update(event.cards_transformed)
+            card_names.update(event.cards_obtained)
+        for campfire in run.campfire_choices:
+            if campfire.action == "SMITH" and campfire.data:
+                card_names.add(campfire.data)
+        for shop in run.shop_contents:
+            relic_names.update(shop.relics)
+            potion_names.update(shop.potions)
+            card_names.update(shop.cards)
+        card_names.update([name.split("+")[0] for name in card_names if name])
+        
+        # どのログにも現れないアイテム（一度も使わなかったポーションなど）はデッキ・レリック・ポーションに加えない
+        item_types = {}
+        for item in run.items_purchased:
+            if item in relic_names:
+                item_types[item] = "relic"
+            elif item in potion_names:
+                item_types[item] = "potion"
+            elif item in card_names or item.split("+")[0] in card_names:
+                item_types[item] = "card"
+            else:
+                item_types[item] = "unknown"
+        return item_types
+    
+    def _get_purchased_items(self, item_type):
+        """指定種別の購入アイテムを (階層, アイテム) の組で取得"""
+        items_purchased = self.run.items_purchased
+        return [
+            (purchase_floor, items_purchased[i])
+            for i, purchase_floor in enumerate(self.run.item_purchase_floors)
+            if i < len(items_purchased) and self._shop_item_types[items_purchased[i]] == item_type
+        ]
+    
+    def _build_relic_timeline(self):
+        """レリックの取得タイムラインを階層順に作成"""
+        self._base_relics = self.initial_relics.copy()
+        
+        # Neowボーナスでのレリック取得（Neowボーナスログから確認）
+        if 'BOSS_RELIC' in self.run.neow_bonus:
+            self._base_relics.extend(self.run.neow_relics)
+        
+        # 各階層で取得したレリックとショップで購入したレリック
+        timeline = [(relic.floor, relic.key) for relic in self.run.relics_obtained]
+        timeline.extend(self._get_purchased_items("relic"))
+        timeline.sort(key=lambda entry: entry[0])
+        
+        self._relic_timeline_floors = [floor for floor, _ in timeline]
+        self._relic_timeline = [relic for _, relic in timeline]
     
     def _get_all_relics_up_to_floor(self, floor):
         """指定階層までに取得した全レリックのリスト"""
-        relics = self.initial_relics.copy()
-        
-        # Neowボーナスでのレリック取得
-        neow_bonus = self.data.get('neow_bonus', '')
-        if 'BOSS_RELIC' in neow_bonus:
-            # Neowボーナスログからレリックを確認
-            neow_log = self.data.get('neow_bonus_log', {})
-            relics_obtained = neow_log.get('relicsObtained', [])
-            relics.extend(relics_obtained)
-        
-        # 各階層で取得したレリック
-        for relic in self.data.get("relics_obtained", []):
-            if relic.get("floor", 999) <= floor:
-                relics.append(relic.get("key"))
-        
-        # ショップで購入したレリック
-        items_purchased = self.data.get("items_purchased", [])
-        item_purchase_floors = self.data.get("item_purchase_floors", [])
-        shop_relics = []
-        for shop in self.data.get("shop_contents", []):
-            if shop.get("floor", 999) <= floor:
-                shop_relics.extend(shop.get("relics", []))
-        
-        for i, purchase_floor in enumerate(item_purchase_floors):
-            if purchase_floor <= floor and i < len(items_purchased):
-                item = items_purchased[i]
-                if item in shop_relics:
-                    relics.append(item)
-        
-        return relics
+        count = bisect_right(self._relic_timeline_floors, floor)
+        return self._base_relics + self._relic_timeline[:count]
     
     def _get_relics_at_floor(self, floor):
         """指定階層でのレリックを取得"""
         return self._get_all_relics_up_to_floor(floor)
     
+    def _get_relic_floor(self, relic):
+        """指定レリックを取得した階層（未取得の場合は None）"""
+        if relic in self._base_relics:
+            return 0
+        if relic in self._relic_timeline:
+            return self._relic_timeline_floors[self._relic_timeline.index(relic)]
+        return None
+    
     def _get_potions_at_floor(self, floor):
         """指定階層でのポーションを取得（スロット管理）"""
+        potions = []
+        for _, potions in self._iter_potion_states(floor):
+            pass
+        return list(potions)
+    
+    def _iter_potion_states(self, last_floor):
+        """ポーションの使用・破棄・取得を階層順に一度だけ適用し、各階層終了時点の所持ポーションを順に返す
+        
+        返されるリストは再生中に更新されるため、呼び出し側で変更しないこと。
+        """
         potion_slots = 2  # 基本スロット数
         potions = []
         
-        # ポーションベルトチェック
-        if "Potion Belt" in self._get_relics_at_floor(floor):
-            potion_slots = 4
-        
-        # 各階層でのポーション取得・使用・破棄を追跡
-        for f in range(1, floor + 1):
-            # 取得
-            for potion in self.data.get("potions_obtained", []):
-                if potion.get("floor") == f:
-                    if len(potions) < potion_slots:
-                        potions.append(potion.get("key"))
+        # ポーションベルトは取得した階層からスロットを増やす
+        belt_floor = self._get_relic_floor("Potion Belt")
+        
+        purchased_potions = {}
+        for purchase_floor, potion in self._get_purchased_items("potion"):
+            purchased_potions.setdefault(purchase_floor, []).append(potion)
+        
+        potion_use = self.run.potion_use_per_floor
+        potion_discard = self.run.potion_discard_per_floor
+        
+        for floor in range(last_floor + 1):
+            if belt_floor is not None and floor >= belt_floor:
+                potion_slots = 4
             
-            # 使用
-            potion_use = self.data.get("potion_use_per_floor", [])
-            if f - 1 < len(potion_use):
-                used_potions = potion_use[f - 1]
-                for used in used_potions:
-                    if used in potions:
-                        potions.remove(used)
+            # 所持しているポーションの使用（戦闘中）と破棄は、その階層での取得より先に行われる
+            removed = []
+            if 0 < floor <= len(potion_use):
+                removed.extend(potion_use[floor - 1])
+            if 0 < floor <= len(potion_discard):
+                removed.extend(potion_discard[floor - 1])
+            unmatched = []
+            for potion in removed:
+                if potion in potions:
+                    potions.remove(potion)
+                else:
+                    unmatched.append(potion)
             
-            # 破棄
-            potion_discard = self.data.get("potion_discard_per_floor", [])
-            if f - 1 < len(potion_discard):
-                discarded_potions = potion_discard[f - 1]
-                for discarded in discarded_potions:
-                    if discarded in potions:
-                        potions.remove(discarded)
-        
-        return potions
+            # 取得（ショップでの購入を含む）
+            for potion in self._get_potions_for_floor(floor) + purchased_potions.get(floor, []):
+                if len(potions) < potion_slots:
+                    potions.append(potion)
+            
+            # 所持していなかったものは、その階層で取得してから使用・破棄した
+            for potion in unmatched:
+                if potion in potions:
+                    potions.remove(potion)
+            
+            yield floor, potions
     
     def _get_event_for_floor(self, floor):
-        for event in self.data.get("event_choices", []):
-            if event.get("floor") == floor:
-                return event
-        return None
+        return self._event_by_floor.get(floor)
     
     def to_markdown(self):
+        return "".join(self.iter_markdown())
+    
+    def iter_markdown(self):
+        """Markdownをセクション（ヘッダー・各階層）ごとのチャンクとして順に返す"""
+        separator = ""
+        for lines in self._iter_sections():
+            yield separator + "\n".join(lines)
+            separator = "\n"
+    
+    def _floor_range(self):
+        """出力する階層の範囲 (開始, 終了)（ランの到達階層までに制限）"""
+        start, end = self.floors or (None, None)
+        start = 0 if start is None else start
+        end = self.run.floor_reached if end is None else min(end, self.run.floor_reached)
+        return start, end
+    
+    def _iter_sections(self):
+        run = self.run
+        sections = self.sections
+        first_floor, last_floor = self._floor_range()
+        render_floors = not sections.isdisjoint(self.FLOOR_SECTIONS) and max(first_floor, 1) <= last_floor
+        render_neow = "neow" in sections and first_floor <= 0
+        
+        if "header" in sections:
+            yield self._header_lines()
+        
         lines = []
+        if "final" in sections:
+            # 最終デッキ
+            lines.append(self.templates.final_deck)
+            for card in run.master_deck:
+                lines.append(f"- {translate(card, self.lang)}")
+            lines.append("")
+            
+            # 最終レリック
+            lines.append(self.templates.final_relics)
+            for relic in run.relics:
+                lines.append(f"- {translate(relic, self.lang)}")
+            lines.append("")
         
-        # ヘッダー情報
-        character = translate(self.data.get('character_chosen', 'Unknown'), self.lang)
-        lines.append(f"# Slay the Spire Run - {character}")
-        lines.append("")
-        lines.append(f"**{translate('seed', self.lang)}**: {self.data.get('seed_played', 'Unknown')}")
-        lines.append(f"**{translate('ascension_level', self.lang)}**: {self.data.get('ascension_level', 0)}")
-        lines.append(f"**{translate('floor_reached', self.lang)}**: {self.data.get('floor_reached', 0)}")
-        victory_text = translate('yes' if self.data.get('victory', False) else 'no', self.lang)
-        lines.append(f"**{translate('victory', self.lang)}**: {victory_text}")
-        if not self.data.get('victory', False):
-            killed_by = translate(self.data.get('killed_by', 'Unknown'), self.lang)
-            lines.append(f"**{translate('killed_by', self.lang)}**: {killed_by}")
-        lines.append(f"**{translate('score', self.lang)}**: {self.data.get('score', 0)}")
-        lines.append(f"**{translate('playtime', self.lang)}**: {self.data.get('playtime', 0)} {translate('seconds', self.lang)}")
-        lines.append("")
+        # 階層ごとの詳細
+        if render_floors or render_neow:
+            lines.append(self.templates.floor_details)
+            lines.append("")
         
+        if render_neow:
+            lines.extend(self._neow_lines())
+        if lines:
+            yield lines
         
-        # 最終デッキ
-        lines.append(f"## {translate('final_deck', self.lang)}")
-        master_deck = self.data.get('master_deck', [])
-        for card in master_deck:
-            lines.append(f"- {translate(card, self.lang)}")
-        lines.append("")
+        if not render_floors:
+            return
         
-        # 最終レリック
-        lines.append(f"## {translate('final_relics', self.lang)}")
-        relics = self.data.get('relics', [])
-        for relic in relics:
-            lines.append(f"- {translate(relic, self.lang)}")
-        lines.append("")
+        # 階層開始時点のデッキ・ポーション（前階層終了時点）を順に再生（出力しない項目は再生しない）
+        deck_displays = None
+        snapshot_floors = None
+        if "deck" in sections:
+            if self.show_deck_details and self.deck_format == "delta":
+                snapshot_floors = self._deck_snapshot_floors(first_floor, last_floor)
+                interval = self.deck_snapshot_interval
+                collapsed_floors = set(range(interval, last_floor + 1, interval)) if interval else set()
+                # 表示用の文字列は前階層終了時点のデッキから作るため、再生する階層は1つ前
+                display_floors = {floor - 1 for floor in snapshot_floors | collapsed_floors}
+                deck_displays = self._iter_deck_displays(last_floor - 1, display_floors)
+            else:
+                deck_displays = self._iter_deck_displays(last_floor - 1)
+        potion_states = iter(self._potion_states(last_floor - 1)) if "potions" in sections else None
+        for floor in range(1, last_floor + 1):
+            deck = next(deck_displays) if deck_displays else None
+            current_potions = next(potion_states) if potion_states else None
+            if floor < first_floor:
+                continue
+            if deck is not None and snapshot_floors is not None:
+                # delta 形式: (枚数, 表示用の文字列, 前階層での変更, デッキ全体を出力するか)
+                deck = deck + (floor in snapshot_floors,)
+            yield self._floor_lines(floor, deck, current_potions)
+    
+    def _header_lines(self):
+        """ランの情報"""
+        run = self.run
+        templates = self.templates
+        lines = []
         
-        # 階層ごとの詳細
-        lines.append(f"## {translate('floor_details', self.lang)}")
+        # ヘッダー情報
+        character = translate(run.character_chosen if run.character_chosen is not None else 'Unknown', self.lang)
+        lines.append(templates.title.format(character))
         lines.append("")
-        
-        # Neowボーナス選択（階層0として表示）
-        lines.append(f"### {translate('neow_bonus', self.lang)}")
-        bonus = translate(self.data.get('neow_bonus', 'Unknown'), self.lang)
-        lines.append(f"- **{translate('bonus', self.lang)}**: {bonus}")
-        cost = translate(self.data.get('neow_cost', 'Unknown'), self.lang)
-        lines.append(f"- **{translate('cost', self.lang)}**: {cost}")
+        lines.append(templates.seed.format(run.seed_played))
+        lines.append(templates.ascension_level.format(run.ascension_level))
+        lines.append(templates.floor_reached.format(run.floor_reached))
+        lines.append(templates.victory_yes if run.victory else templates.victory_no)
+        if not run.victory:
+            killed_by = translate(run.killed_by, self.lang)
+            lines.append(templates.killed_by.format(killed_by))
+        lines.append(templates.score.format(run.score))
+        lines.append(templates.playtime.format(run.playtime))
+        lines.append("")
+        return lines
+    
+    def _neow_lines(self):
+        """Neowボーナス選択（階層0として表示）"""
+        run = self.run
+        templates = self.templates
+        lines = []
+        lines.append(templates.neow_bonus)
+        bonus = translate(run.neow_bonus, self.lang)
+        lines.append(templates.bonus.format(bonus))
+        cost = translate(run.neow_cost, self.lang)
+        lines.append(templates.cost.format(cost))
         
         # カード選択（階層0のカード選択があれば表示）
-        neow_card_choice = None
-        for choice in self.data.get("card_choices", []):
-            if choice.get("floor") == 0:
-                neow_card_choice = choice
-                break
+        neow_card_choice = self._get_cards_for_floor(0)
         
         if neow_card_choice:
-            picked = neow_card_choice.get('picked', '')
-            not_picked = neow_card_choice.get('not_picked', []) or []
+            picked = neow_card_choice.picked
+            not_picked = neow_card_choice.not_picked
             
             translated_cards = []
             if not_picked:
@@ -372,175 +785,387 @@ class STSRunParser:
                 translated_cards.append(f"({translate(picked, self.lang)})")
             
             if translated_cards:
-                lines.append(f"- **{translate('card_choice', self.lang)}**: {', '.join(translated_cards)}")
+                lines.append(templates.card_choice.format(', '.join(translated_cards)))
         
         lines.append("")
+        return lines
+    
+    def _floor_lines(self, floor, deck, current_potions):
+        """階層の詳細（deck・current_potions は階層開始時点の (デッキの枚数, 表示用の文字列)・ポーション、出力しない場合は None）"""
+        sections = self.sections
+        templates = self.templates
+        lines = []
+        floor_data = self._cached_floor_data(floor)
         
-        floor_reached = self.data.get('floor_reached', 0)
-        for floor in range(1, floor_reached + 1):
-            floor_data = self.get_floor_data(floor)
-            
-            path = translate(floor_data['path'] or '?', self.lang)
-            lines.append(f"### {translate('floor', self.lang)} {floor} - {path}")
-            
-            # 現在の所有物（折りたたみ可能）
-            current_deck = self._get_deck_at_floor(floor - 1)  # 階層開始時点なので-1
-            current_relics = self._get_relics_at_floor(floor - 1)
-            current_potions = self._get_potions_at_floor(floor - 1)
-            
-            # デッキ（枚数のみ表示、詳細はオプション）
-            deck_count = len(current_deck)
-            if self.show_deck_details:
-                translated_deck = translate_list(current_deck, self.lang)
-                # カードごとの出現回数をカウント
-                from collections import Counter
-                card_counts = Counter(translated_deck)
-                deck_display = []
-                for card, count in sorted(card_counts.items()):
-                    if count > 1:
-                        deck_display.append(f"{card} x{count}")
-                    else:
-                        deck_display.append(card)
-                lines.append(f"- **{translate('current_deck', self.lang)}** ({deck_count} {translate('card_count', self.lang)}): {', '.join(deck_display)}")
+        path = translate(floor_data['path'] or '?', self.lang)
+        lines.append(templates.floor.format(floor, path))
+        
+        # デッキ（枚数のみ表示、詳細はオプション）
+        if deck is not None:
+            deck_count, deck_display, deck_delta = deck[:3]
+            if len(deck) > 3 and not deck[3]:
+                # delta 形式: 前階層からの変更のみ表示し、一定間隔でデッキ全体を折りたたんで表示
+                deck_line = templates.deck_count.format(deck_count)
+                if deck_delta:
+                    deck_line += f" ({self._deck_delta_text(deck_delta)})"
+                lines.append(deck_line)
+                if deck_display is not None:
+                    lines.append("")
+                    lines.append(templates.deck_summary.format(deck_count))
+                    lines.append("")
+                    lines.append(deck_display)
+                    lines.append("")
+                    lines.append("</details>")
+                    lines.append("")
+            elif self.show_deck_details:
+                lines.append(templates.deck_details.format(deck_count, deck_display))
             else:
-                lines.append(f"- **{translate('current_deck', self.lang)}**: {deck_count} {translate('card_count', self.lang)}")
-            
-            # レリック
+                lines.append(templates.deck_count.format(deck_count))
+        
+        # レリック
+        if "relics" in sections:
+            current_relics = self._get_relics_at_floor(floor - 1)
             if current_relics:
                 translated_relics = translate_list(current_relics, self.lang)
-                lines.append(f"- **{translate('current_relics', self.lang)}**: {', '.join(translated_relics)}")
+                lines.append(templates.current_relics.format(', '.join(translated_relics)))
+        
+        # ポーション
+        if current_potions:
+            translated_potions = translate_list(current_potions, self.lang)
+            lines.append(templates.current_potions.format(', '.join(translated_potions)))
+        
+        # HP とゴールド
+        if "hp" in sections and floor_data['current_hp'] is not None:
+            hp_diff = ""
+            if floor_data['current_hp_prev'] is not None:
+                diff = floor_data['current_hp'] - floor_data['current_hp_prev']
+                if diff != 0:
+                    hp_diff = f" ({diff:+d})"
             
-            # ポーション
-            if current_potions:
-                translated_potions = translate_list(current_potions, self.lang)
-                lines.append(f"- **{translate('current_potions', self.lang)}**: {', '.join(translated_potions)}")
+            max_hp_diff = ""
+            if floor_data['max_hp_prev'] is not None and floor_data['max_hp'] != floor_data['max_hp_prev']:
+                max_diff = floor_data['max_hp'] - floor_data['max_hp_prev']
+                max_hp_diff = f" ({max_diff:+d})"
             
-            # HP とゴールド
-            if floor_data['current_hp'] is not None:
-                hp_diff = ""
-                if floor_data['current_hp_prev'] is not None:
-                    diff = floor_data['current_hp'] - floor_data['current_hp_prev']
-                    if diff != 0:
-                        hp_diff = f" ({diff:+d})"
+            lines.append(templates.hp.format(floor_data['current_hp'], hp_diff, floor_data['max_hp'], max_hp_diff))
+        
+        if "gold" in sections and floor_data['gold'] is not None:
+            gold_diff = ""
+            if floor_data['gold_prev'] is not None:
+                diff = floor_data['gold'] - floor_data['gold_prev']
+                if diff != 0:
+                    gold_diff = f" ({diff:+d})"
+            lines.append(templates.gold.format(floor_data['gold'], gold_diff))
+        
+        # 戦闘情報
+        if "combat" in sections and floor_data['damage_taken']:
+            damage = floor_data['damage_taken']
+            enemies = translate(damage.enemies, self.lang)
+            lines.append(templates.combat.format(enemies, damage.damage, damage.turns))
+        
+        # 取得アイテム
+        rewards = "rewards" in sections
+        if rewards and floor_data['cards_obtained']:
+            card_choice = floor_data['cards_obtained']
+            if card_choice:
+                picked = card_choice.picked
+                not_picked = card_choice.not_picked
                 
-                max_hp_diff = ""
-                if floor_data['max_hp_prev'] is not None and floor_data['max_hp'] != floor_data['max_hp_prev']:
-                    max_diff = floor_data['max_hp'] - floor_data['max_hp_prev']
-                    max_hp_diff = f" ({max_diff:+d})"
+                translated_cards = []
+                for card in not_picked:
+                    translated_cards.append(translate(card, self.lang))
+                if picked:
+                    translated_cards.append(f"({translate(picked, self.lang)})")
                 
-                lines.append(f"- **{translate('hp', self.lang)}**: {floor_data['current_hp']}{hp_diff}/{floor_data['max_hp']}{max_hp_diff}")
-            
-            if floor_data['gold'] is not None:
-                gold_diff = ""
-                if floor_data['gold_prev'] is not None:
-                    diff = floor_data['gold'] - floor_data['gold_prev']
-                    if diff != 0:
-                        gold_diff = f" ({diff:+d})"
-                lines.append(f"- **{translate('gold', self.lang)}**: {floor_data['gold']}{gold_diff}")
-            
-            # 戦闘情報
-            if floor_data['damage_taken']:
-                damage = floor_data['damage_taken']
-                enemies = translate(damage['enemies'], self.lang)
-                lines.append(f"- **{translate('combat', self.lang)}**: {enemies} ({translate('damage', self.lang)}: {damage['damage']}, {translate('turns', self.lang)}: {damage['turns']})")
-            
-            # 取得アイテム
-            if floor_data['cards_obtained']:
-                card_choice = floor_data['cards_obtained']
-                if card_choice:
-                    picked = card_choice.get('picked', '')
-                    not_picked = card_choice.get('not_picked', []) or []
-                    
-                    translated_cards = []
-                    for card in not_picked:
-                        translated_cards.append(translate(card, self.lang))
-                    if picked:
-                        translated_cards.append(f"({translate(picked, self.lang)})")
-                    
-                    if translated_cards:
-                        lines.append(f"- **{translate('card_choice', self.lang)}**: {', '.join(translated_cards)}")
-            
-            if floor_data['relics_obtained']:
-                translated_relics = translate_list(floor_data['relics_obtained'], self.lang)
-                lines.append(f"- **{translate('relic_obtained', self.lang)}**: {', '.join(translated_relics)}")
-            
-            if floor_data['potions_obtained']:
-                translated_potions = translate_list(floor_data['potions_obtained'], self.lang)
-                lines.append(f"- **{translate('potion_obtained', self.lang)}**: {', '.join(translated_potions)}")
-            
-            # 休憩所
-            if floor_data['campfire_choices']:
-                campfire = floor_data['campfire_choices']
-                if campfire:
-                    action = translate(campfire.get('action', ''), self.lang)
-                    data = campfire.get('data')
-                    if data:
-                        data_translated = translate(data, self.lang)
-                        lines.append(f"- **{translate('campfire', self.lang)}**: {action} ({data_translated})")
-                    else:
-                        lines.append(f"- **{translate('campfire', self.lang)}**: {action}")
-            
-            # ショップ
-            if floor_data['shop_contents']:
-                shop = floor_data['shop_contents']
-                if shop:
-                    lines.append(f"- **{translate('shop', self.lang)}**:")
-                    if shop.get('cards'):
-                        translated_cards = translate_list(shop['cards'], self.lang)
-                        lines.append(f"  - {translate('cards', self.lang)}: {', '.join(translated_cards)}")
-                    if shop.get('relics'):
-                        translated_relics = translate_list(shop['relics'], self.lang)
-                        lines.append(f"  - {translate('relics', self.lang)}: {', '.join(translated_relics)}")
-                    if shop.get('potions'):
-                        translated_potions = translate_list(shop['potions'], self.lang)
-                        lines.append(f"  - {translate('potions', self.lang)}: {', '.join(translated_potions)}")
+                if translated_cards:
+                    lines.append(templates.card_choice.format(', '.join(translated_cards)))
+        
+        if rewards and floor_data['relics_obtained']:
+            translated_relics = translate_list(floor_data['relics_obtained'], self.lang)
+            lines.append(templates.relic_obtained.format(', '.join(translated_relics)))
+        
+        if rewards and floor_data['potions_obtained']:
+            translated_potions = translate_list(floor_data['potions_obtained'], self.lang)
+            lines.append(templates.potion_obtained.format(', '.join(translated_potions)))
+        
+        # 休憩所
+        if "campfire" in sections and floor_data['campfire_choices']:
+            campfire = floor_data['campfire_choices']
+            if campfire:
+                action = translate(campfire.action, self.lang)
+                data = campfire.data
+                if data:
+                    data_translated = translate(data, self.lang)
+                    lines.append(templates.campfire_data.format(action, data_translated))
+                else:
+                    lines.append(templates.campfire.format(action))
+        
+        # ショップ
+        if "shop" in sections and floor_data['shop_contents']:
+            shop = floor_data['shop_contents']
+            if shop:
+                lines.append(templates.shop)
+                if shop.cards:
+                    translated_cards = translate_list(shop.cards, self.lang)
+                    lines.append(templates.shop_cards.format(', '.join(translated_cards)))
+                if shop.relics:
+                    translated_relics = translate_list(shop.relics, self.lang)
+                    lines.append(templates.shop_relics.format(', '.join(translated_relics)))
+                if shop.potions:
+                    translated_potions = translate_list(shop.potions, self.lang)
+                    lines.append(templates.shop_potions.format(', '.join(translated_potions)))
+                
+                # ショップでの購入行動
+                if floor_data['shop_purchases']:
+                    purchases = floor_data['shop_purchases']
+                    purchase_actions = []
+                    for purchase in purchases:
+                        if purchase['type'] == 'purchase':
+                            translated_item = translate(purchase['item'], self.lang)
+                            purchase_actions.append(templates.purchased.format(translated_item))
+                        elif purchase['type'] == 'purge':
+                            translated_item = translate(purchase['item'], self.lang)
+                            purchase_actions.append(templates.purged.format(translated_item))
                     
-                    # ショップでの購入行動
-                    if floor_data['shop_purchases']:
-                        purchases = floor_data['shop_purchases']
-                        purchase_actions = []
-                        for purchase in purchases:
-                            if purchase['type'] == 'purchase':
-                                translated_item = translate(purchase['item'], self.lang)
-                                purchase_actions.append(f"{translate('purchased', self.lang)}: {translated_item}")
-                            elif purchase['type'] == 'purge':
-                                translated_item = translate(purchase['item'], self.lang)
-                                purchase_actions.append(f"{translate('purged', self.lang)}: {translated_item}")
-                        
-                        if purchase_actions:
-                            lines.append(f"  - {translate('shop_purchases', self.lang)}: {', '.join(purchase_actions)}")
-            
-            # イベント
-            if floor_data['event_choices']:
-                event = floor_data['event_choices']
-                if event:
-                    event_name = translate(event.get('event_name', 'Unknown'), self.lang)
-                    player_choice = translate(event.get('player_choice', ''), self.lang)
-                    lines.append(f"- **{translate('event', self.lang)}**: {event_name} - {player_choice}")
-            
-            lines.append("")
+                    if purchase_actions:
+                        lines.append(templates.shop_purchases.format(', '.join(purchase_actions)))
+        
+        # イベント
+        if "event" in sections and floor_data['event_choices']:
+            event = floor_data['event_choices']
+            if event:
+                event_name = translate(event.event_name, self.lang)
+                player_choice = translate(event.player_choice, self.lang)
+                lines.append(templates.event.format(event_name, player_choice))
         
-        return "\n".join(lines)
+        lines.append("")
+        return lines
+
+def run_output_file(data, run_file, char_output_path, output_path):
+    """出力ファイルのパス（キャラクター別ディレクトリが未定の場合はファイル内容のキャラクターから決める）"""
+    if char_output_path is None:
+        char_output_path = output_path / data.get('character_chosen', 'UNKNOWN')
+    return char_output_path / f"{run_file.stem}.md"
+
+def renderer_fingerprint():
+    """変換処理（このモジュールとランデータのモデル）のハッシュ"""
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(Path(__file__).with_name("run_model.py").read_bytes())
+    return digest.hexdigest()[:16]
+
+def load_manifest(output_path):
+    """出力ディレクトリのマニフェストを読み込む（存在しない・壊れている場合は空）"""
+    try:
+        with open(output_path / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(output_path, entries):
+    """マニフェストを出力ディレクトリに保存（中断されても壊れたマニフェストが残らないよう置き換えで書き込む）"""
+    manifest = {"version": MANIFEST_VERSION, "files": entries}
+    write_if_changed(output_path / MANIFEST_NAME, encode_chunks([json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True), "\n"]))
+
+def _is_up_to_date(entry, digest, options, output_path):
+    """入力・オプションが前回の変換から変わっておらず、出力も残っているか"""
+    return (
+        entry is not None
+        and entry.get("sha256") == digest
+        and entry.get("options") == options
+        and (output_path / entry.get("output", "")).is_file()
+    )
+
+def _error_result(e):
+    import traceback
+    # 例外はプロセス間で受け渡せるよう文字列化する
+    return {"error": str(e), "detail": traceback.format_exc()}
+
+def _conversion_task(run_file, char_dir, show_deck_details, trees, manifests):
+    """変換タスク（trees は言語ごとの (言語, 出力ディレクトリ, 変換オプション)、manifests は言語ごとのマニフェスト）"""
+    targets = tuple(
+        (lang, tree, None if char_dir is None else tree / char_dir, manifests[lang].get(run_file.as_posix()), options)
+        for lang, tree, options in trees
+    )
+    return (run_file, show_deck_details, targets)
 
-def parse_run_file(file_path, lang="en", show_deck_details=False):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+def _skipped_output(target):
+    lang, output_path, _, entry, _ = target
+    return {"lang": lang, "output_file": output_path / entry["output"], "manifest_entry": entry, "skipped": True}
+
+def _read_task(task):
+    """読み込み段: ファイルを読み込み、すべての言語の出力が前回の変換から変更されていなければスキップする"""
+    run_file, show_deck_details, targets = task
+    try:
+        # ファイルの読み込みは一度だけ行い、ハッシュの計算・出力先の判定・変換に使う
+        raw = run_file.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        up_to_date = [_is_up_to_date(entry, digest, options, output_path) for _, output_path, _, entry, options in targets]
+        if all(up_to_date):
+            return {"outputs": [_skipped_output(target) for target in targets]}
+        return {"next": (task, digest, raw, up_to_date)}
+    except Exception as e:
+        return _error_result(e)
+
+def _render_task(payload, stream=False):
+    """変換段: ランデータをデコードして言語ごとのMarkdownに変換し、(出力ファイル, エンコード済みのチャンク) のリストを返す
     
-    parser = STSRunParser(data, lang, show_deck_details)
-    return parser.to_markdown()
+    パイプラインではプロセス間で受け渡せるようチャンクのリストを返す（キューに保持される文書は queue_size 件まで）。
+    stream が真の場合はチャンクを生成するジェネレーターを返し、書き込み段で生成しながら書き込む（文書全体を保持しない）。
+    """
+    task, digest, raw, up_to_date = payload
+    run_file, show_deck_details, targets = task
+    try:
+        # 変換に使わないフィールドはデコードも保持もしない
+        data = decode_run(raw, RunModel.FIELDS)
+        stale = [target for target, skip in zip(targets, up_to_date) if not skip]
+        # デコードと階層ごとの再生は一度だけ行い、2つ目以降の言語では翻訳と整形のみ行う
+        lang, options = stale[0][0], stale[0][4]
+        parser = STSRunParser(
+            data, lang, show_deck_details, options.get("floors"), options.get("sections"),
+            options.get("deck_format", "full"), options.get("deck_snapshot_interval", 0),
+        )
+        parsers = iter([parser] + [parser.with_lang(target[0]) for target in stale[1:]])
+        outputs = []
+        for (_, output_path, char_output_path, _, _), skip in zip(targets, up_to_date):
+            if skip:
+                outputs.append(None)
+                continue
+            output_file = run_output_file(data, run_file, char_output_path, output_path)
+            # 結合した文字列は作らず、チャンクごとにエンコードして書き込み段に渡す
+            encode = iter_encoded_chunks if stream else encode_chunks
+            outputs.append((output_file, encode(next(parsers).iter_markdown())))
+        return {"next": (task, digest, outputs)}
+    except Exception as e:
+        return _error_result(e)
 
-@click.command()
-@click.argument('input_dirs', nargs=-1, type=click.Path(exists=True), required=True)
-@click.option('--output-dir', '-o', default='output', help='Output directory')
-@click.option('--lang', '-l', default='en', type=click.Choice(['en', 'ja']), help='Language for output (en/ja)')
-@click.option('--show-deck-details', '-d', is_flag=True, help='Show detailed deck contents at each floor')
-def main(input_dirs, output_dir, lang, show_deck_details):
-    """Convert JSON files in the input directories to Markdown format."""
-    output_path = Path(output_dir)
+def _write_task(payload):
+    """書き込み段: 言語ごとのMarkdownを出力ファイルに書き込み、マニフェストのエントリを返す（内容が同じ場合は書き込まない）"""
+    task, digest, rendered = payload
+    targets = task[2]
+    try:
+        outputs = []
+        for target, output in zip(targets, rendered):
+            if output is None:
+                outputs.append(_skipped_output(target))
+                continue
+            lang, output_path, _, _, options = target
+            output_file, chunks = output
+            output_file.parent.mkdir(exist_ok=True)
+            written = write_if_changed(output_file, chunks)
+            manifest_entry = {
+                "sha256": digest,
+                "options": options,
+                "output": output_file.relative_to(output_path).as_posix(),
+            }
+            outputs.append({"lang": lang, "output_file": output_file, "manifest_entry": manifest_entry, "skipped": False, "written": written})
+        return {"outputs": outputs}
+    except Exception as e:
+        return _error_result(e)
+
+def _convert_task(task):
+    """変換タスクの各段をこのスレッドで順に実行して結果を返す（Markdownは生成しながら書き込む）"""
+    result = _read_task(task)
+    if "next" in result:
+        result = _render_task(result["next"], stream=True)
+    if "next" in result:
+        result = _write_task(result["next"])
+    return result
+
+@contextmanager
+def _profiling_hooks(profiler):
+    """変換に使う関数・クラスを計測用のものに一時的に差し替える"""
+    module = globals()
+    hooks = {
+        "_read_task": profiler.wrap(_read_task, "read"),
+        "decode_run": profiler.wrap(decode_run, "decode"),
+        "STSRunParser": STSRunParser.profiled(profiler),
+        "translate": profiler.wrap(translate, "translation"),
+        "translate_list": profiler.wrap(translate_list, "translation"),
+        "encode_chunks": profiler.wrap(encode_chunks, "write"),
+        "iter_encoded_chunks": profiler.wrap_generator(iter_encoded_chunks, "write"),
+        "write_if_changed": profiler.wrap(write_if_changed, "write"),
+    }
+    originals = {name: module[name] for name in hooks}
+    module.update(hooks)
+    try:
+        yield
+    finally:
+        module.update(originals)
+
+def _run_profiled(tasks, profiler, on_result):
+    """変換タスクをこのスレッドで順に実行し、ファイルごと・段階ごとの時間を計測する"""
+    with _profiling_hooks(profiler):
+        for task in tasks:
+            run_file = task[0]
+            try:
+                size = run_file.stat().st_size
+            except OSError:
+                size = None
+            profiler.start_file(run_file.as_posix(), size)
+            result = _convert_task(task)
+            # 言語ごとの出力がすべてスキップされた場合のみスキップとする（エラーは言語によらずタスク単位）
+            outputs = result.get("outputs", [])
+            skipped = bool(outputs) and all(output.get("skipped") for output in outputs)
+            profiler.end_file(skipped=skipped, error=result.get("error"))
+            on_result(task, result)
+
+def print_profile(report, top=10):
+    """プロファイルの結果（最も遅いファイルと段階ごとの合計）を rich のテーブルで表示"""
+    phase_seconds = report["phase_seconds"]
+    total = sum(phase_seconds.values()) or 1.0
+    console.print(_stats_table(
+        "Time by phase",
+        [("Phase", "left"), ("Total ms", "right"), ("Share", "right"), ("Mean ms/file", "right")],
+        [
+            (phase, f"{seconds * 1000:.1f}", _format_rate(seconds / total), f"{seconds * 1000 / max(report['files'], 1):.2f}")
+            for phase, seconds in sorted(phase_seconds.items(), key=lambda item: -item[1])
+            if seconds
+        ],
+    ))
     
-    # 出力ディレクトリの作成
-    output_path.mkdir(exist_ok=True)
+    rows = []
+    for record in report["per_file"][:top]:
+        phases = record["phases"]
+        slowest = max(phases, key=phases.get) if phases else "-"
+        file_path = Path(record["file"])
+        rows.append((
+            f"{file_path.parent.name}/{file_path.name}",
+            str(record["floors"] if record["floors"] is not None else "-"),
+            f"{record['bytes'] / 1024:.0f}" if record["bytes"] is not None else "-",
+            f"{record['seconds'] * 1000:.1f}",
+            f"{record['peak_memory_bytes'] / 1024:.0f}" if record["peak_memory_bytes"] is not None else "-",
+            f"{slowest} ({phases[slowest] * 1000:.1f} ms)" if phases else "-",
+        ))
+    console.print(_stats_table(
+        "Slowest files",
+        [("File", "left"), ("Floors", "right"), ("KiB", "right"), ("ms", "right"), ("Peak KiB", "right"), ("Slowest phase", "left")],
+        rows,
+    ))
+
+class DefaultCommandGroup(click.Group):
+    """サブコマンドが指定されない場合は default_command を実行するグループ"""
+    
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
     
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+@click.group(cls=DefaultCommandGroup, default_command='convert')
+def main():
+    """Convert Slay the Spire run files (default command: convert)."""
+
+def collect_run_files(input_dirs):
+    """入力ディレクトリから .run ファイルを (ファイル, キャラクター別ディレクトリ名) の組で収集
+    
+    runs ディレクトリは再帰的に探索し、キャラクターは読み込んだ内容から判定する（ディレクトリ名は None）。
+    """
     all_run_files = []
     
     # 各入力ディレクトリから.runファイルを収集
@@ -555,21 +1180,9 @@ def main(input_dirs, output_dir, lang, show_deck_details):
             if run_files:
                 console.print(f"[cyan]{input_path.name}[/cyan] ディレクトリから {len(run_files)} 個のファイルを見つけました（再帰的検索）")
                 
-                # ファイルごとにキャラクターを判定
+                # キャラクターは変換時に読み込んだ内容から判定する（出力先は未定）
                 for run_file in run_files:
-                    # ファイル内容からキャラクターを判定
-                    try:
-                        with open(run_file, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            character = data.get('character_chosen', 'UNKNOWN')
-                            
-                        # キャラクター別サブディレクトリを作成
-                        char_output_path = output_path / character
-                        char_output_path.mkdir(exist_ok=True)
-                        
-                        all_run_files.append((run_file, char_output_path))
-                    except Exception as e:
-                        console.print(f"[yellow]警告[/yellow]: {run_file.name} の読み込みに失敗しました: {e}")
+                    all_run_files.append((run_file, None))
             else:
                 console.print(f"[yellow]警告[/yellow]: {input_path.name} に .runファイルが見つかりません")
         else:
@@ -579,43 +1192,475 @@ def main(input_dirs, output_dir, lang, show_deck_details):
             if run_files:
                 console.print(f"[cyan]{input_path.name}[/cyan] ディレクトリから {len(run_files)} 個のファイルを見つけました")
                 
-                # キャラクター別サブディレクトリを作成
-                char_output_path = output_path / input_path.name
-                char_output_path.mkdir(exist_ok=True)
-                
                 for run_file in run_files:
-                    all_run_files.append((run_file, char_output_path))
+                    all_run_files.append((run_file, input_path.name))
             else:
                 console.print(f"[yellow]警告[/yellow]: {input_path.name} に .runファイルが見つかりません")
     
+    return all_run_files
+
+def _parse_floor_range(ctx, param, value):
+    """--floors の値（17-33, 17, 17-, -33）を (開始, 終了) に変換"""
+    if value is None:
+        return None
+    start, separator, end = value.partition("-")
+    try:
+        start = int(start) if start.strip() else None
+        end = int(end) if end.strip() else None
+    except ValueError:
+        raise click.BadParameter(f"{value} は階層の範囲（例: 17-33）ではありません")
+    if not separator:
+        end = start
+    if start is None and end is None or start is not None and start < 0:
+        raise click.BadParameter(f"{value} は階層の範囲（例: 17-33）ではありません")
+    if start is not None and end is not None and start > end:
+        raise click.BadParameter(f"{value} の開始階層が終了階層より大きいです")
+    return (start, end)
+
+def _parse_sections(ctx, param, value):
+    """--sections の値（カンマ区切り）をセクションのリストに変換"""
+    if value is None:
+        return None
+    sections = [section.strip() for section in value.split(",") if section.strip()]
+    unknown = [section for section in sections if section not in STSRunParser.SECTIONS]
+    if unknown:
+        raise click.BadParameter(f"不明なセクション: {', '.join(unknown)}（{', '.join(STSRunParser.SECTIONS)} から選択）")
+    return sorted(set(sections), key=STSRunParser.SECTIONS.index)
+
+def _parse_langs(ctx, param, value):
+    """--lang の値（カンマ区切り、all はすべての言語）を言語のリストに変換"""
+    if value.strip() == "all":
+        return list(LANGUAGES)
+    langs = [lang.strip() for lang in value.split(",") if lang.strip()]
+    unknown = [lang for lang in langs if lang not in LANGUAGES]
+    if unknown or not langs:
+        raise click.BadParameter(f"不明な言語: {', '.join(unknown) or value}（{', '.join(LANGUAGES)} または all から選択）")
+    return list(dict.fromkeys(langs))
+
+@main.command()
+@click.argument('input_dirs', nargs=-1, type=click.Path(exists=True), required=True)
+@click.option('--output-dir', '-o', default='output', help='Output directory')
+@click.option('--lang', '-l', 'langs', default='en', callback=_parse_langs, metavar='LANGS', help='Language(s) for output: en, ja, a comma-separated list (en,ja) or all; with several languages each is written to its own subdirectory of the output directory')
+@click.option('--show-deck-details', '-d', is_flag=True, help='Show detailed deck contents at each floor')
+@click.option('--floors', callback=_parse_floor_range, metavar='RANGE', help='Only render these floors (e.g. 17-33, 17-, -16; floor 0 is the Neow bonus)')
+@click.option('--deck-format', default='full', type=click.Choice(STSRunParser.DECK_FORMATS), show_default=True, help='With -d: full deck on every floor, or full deck at the run start and each act start and only the changes on other floors')
+@click.option('--deck-snapshot-interval', default=0, type=click.IntRange(min=0), show_default=True, help='With --deck-format delta: also show the full deck in a collapsible block every N floors (0: off)')
+@click.option('--sections', callback=_parse_sections, metavar='LIST', help=f"Comma-separated sections to render (default: all of {','.join(STSRunParser.SECTIONS)})")
+@click.option('--jobs', '-j', default=os.cpu_count() or 1, type=click.IntRange(min=1), show_default=True, help='Number of worker processes')
+@click.option('--io-workers', default=4, type=click.IntRange(min=1), show_default=True, help='Number of threads reading and writing files')
+@click.option('--queue-size', default=8, type=click.IntRange(min=1), show_default=True, help='Maximum number of files buffered between pipeline stages')
+@click.option('--timeout', default=60.0, type=click.FloatRange(min=0, min_open=True), show_default=True, help='Per-file timeout in seconds (with --jobs > 1)')
+@click.option('--force', '-f', is_flag=True, help='Convert all files even if unchanged since the last run')
+@click.option('--watch', '-w', is_flag=True, help='Keep running and convert new or changed run files as they are written')
+@click.option('--debounce', default=0.5, type=click.FloatRange(min=0), show_default=True, help='Seconds without writes before a watched file is converted')
+@click.option('--profile', is_flag=True, help='Time each conversion phase per file (files are converted one at a time) and print a summary')
+@click.option('--profile-output', default='profile.json', show_default=True, type=click.Path(dir_okay=False), help='JSON report written with --profile')
+def convert(input_dirs, output_dir, langs, show_deck_details, deck_format, deck_snapshot_interval, floors, sections, jobs, io_workers, queue_size, timeout, force, watch, debounce, profile, profile_output):
+    """Convert JSON files in the input directories to Markdown format."""
+    output_path = Path(output_dir)
+    
+    # 出力ディレクトリの作成
+    output_path.mkdir(exist_ok=True)
+    
+    if profile:
+        from run_profiler import PhaseProfiler
+    profiler = PhaseProfiler() if profile else None
+    if profiler:
+        profiler.start()
+    with profiler.phase("discovery") if profiler else nullcontext():
+        collected_run_files = collect_run_files(input_dirs)
+    
+    # 言語ごとの出力ディレクトリ（複数の言語の場合は出力ディレクトリの下に言語ごとのサブディレクトリを作る）
+    trees = []
+    for lang in langs:
+        tree = output_path if len(langs) == 1 else output_path / lang
+        tree.mkdir(exist_ok=True)
+        options = {
+            "lang": lang,
+            "show_deck_details": show_deck_details,
+            "translations": translation_fingerprint(lang),
+            "renderer": renderer_fingerprint(),
+        }
+        # 出力する階層・セクションを絞り込んだ場合のみ記録する（指定しない場合のマニフェストは従来と同じ）
+        if floors is not None:
+            options["floors"] = list(floors)
+        if sections is not None:
+            options["sections"] = sections
+        if deck_format != "full":
+            options["deck_format"] = deck_format
+            options["deck_snapshot_interval"] = deck_snapshot_interval
+        trees.append((lang, tree, options))
+    
+    for run_file, char_dir in collected_run_files:
+        if char_dir is not None:
+            # キャラクター別サブディレクトリを作成
+            for _, tree, _ in trees:
+                (tree / char_dir).mkdir(exist_ok=True)
+    
+    if not collected_run_files and not watch:
+        console.print("[red]エラー: .runファイルが見つかりません。[/red]")
+        return
+    
+    if collected_run_files:
+        console.print(f"[green]合計 {len(collected_run_files)} 個のファイルを処理します...[/green]")
+    else:
+        # 監視する場合は、まだ .run ファイルのないディレクトリでもそのまま監視を始める
+        console.print("[yellow]警告[/yellow]: .runファイルはまだありません。新しいファイルを待ちます。")
+    
+    # 入力のハッシュと変換オプションが前回と同じファイルは変換をスキップする（マニフェストは出力ディレクトリごと）
+    manifests = {lang: {} if force else load_manifest(tree) for lang, tree, _ in trees}
+    tasks = [
+        _conversion_task(run_file, char_dir, show_deck_details, trees, manifests)
+        for run_file, char_dir in collected_run_files
+    ]
+    
+    counts = {"succeeded": 0, "written": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    
+    def report(task, result):
+        run_file = task[0]
+        console.print(f"Processing: {run_file.parent.name}/{run_file.name}")
+        if "error" in result:
+            counts["failed"] += 1
+            for manifest in manifests.values():
+                manifest.pop(run_file.as_posix(), None)
+            console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {result['error']}")
+            if result.get("detail"):
+                console.print(f"[red]詳細[/red]: {result['detail']}")
+            return
+        
+        for output in result["outputs"]:
+            output_name = output["output_file"].relative_to(output_path).as_posix()
+            manifests[output["lang"]][run_file.as_posix()] = output["manifest_entry"]
+            if output["skipped"]:
+                counts["skipped"] += 1
+                console.print(f"[dim]-[/dim] {output_name} は変更がないためスキップしました")
+            elif output["written"]:
+                counts["succeeded"] += 1
+                counts["written"] += 1
+                console.print(f"[green]✓[/green] {output_name} を生成しました")
+            else:
+                counts["succeeded"] += 1
+                counts["unchanged"] += 1
+                console.print(f"[green]✓[/green] {output_name} は内容が同じため書き込みませんでした")
+    
+    if profiler:
+        # 段階ごとの時間が重ならないよう、計測時はパイプラインを使わずに順に変換する
+        _run_profiled(tasks, profiler, report)
+        profiler.stop()
+    elif len(tasks) == 1:
+        # 1件のみの場合は重ねて実行できる処理がないため、パイプラインを使わずにこのスレッドで変換する
+        report(tasks[0], _convert_task(tasks[0]))
+    else:
+        from run_pipeline import ConversionPipeline
+        # 読み込み・変換・書き込みを重ねて実行する（結果は入力順に受け取り、ログ出力の順序を一定に保つ）
+        pipeline = ConversionPipeline(_read_task, _render_task, _write_task, jobs, io_workers, queue_size, timeout)
+        pipeline.run(tasks, report)
+    
+    for lang, tree, _ in trees:
+        save_manifest(tree, manifests[lang])
+    
+    console.print(f"\n[green]完了![/green] Markdownファイルは {output_path} に保存されました。")
+    console.print(f"成功: {counts['succeeded']} 件（書き込み: {counts['written']} 件, 内容の変更なし: {counts['unchanged']} 件）, スキップ: {counts['skipped']} 件, 失敗: {counts['failed']} 件")
+    
+    if profiler:
+        profile_report = profiler.to_dict(
+            lang=",".join(langs),
+            show_deck_details=show_deck_details,
+            tracemalloc=profiler.trace_memory,
+            translation_cache=translation_cache_info(),
+        )
+        with open(profile_output, 'w', encoding='utf-8') as f:
+            json.dump(profile_report, f, ensure_ascii=False, indent=2)
+        console.print()
+        print_profile(profile_report)
+        console.print(f"プロファイルは {profile_output} に保存されました。（計測のオーバーヘッドを含むため、時間は段階・ファイル間の比較に使ってください）")
+    
+    if watch:
+        watch_and_convert(input_dirs, output_path, show_deck_details, trees, manifests, debounce)
+
+def watch_and_convert(input_dirs, output_path, show_deck_details, trees, manifests, debounce=0.5):
+    """入力ディレクトリを監視し、書き込みが完了した .run ファイルをこのプロセスで順に変換する
+    
+    trees は言語ごとの (言語, 出力ディレクトリ, 変換オプション)、manifests は言語ごとのマニフェスト。
+    """
+    from run_watcher import RunFileWatcher
+    
+    # runs ディレクトリは再帰的に監視し、キャラクターは内容から判定する（collect_run_files と同じ規則）
+    roots = [(Path(input_dir), Path(input_dir).name.lower() == 'runs') for input_dir in input_dirs]
+    watcher = RunFileWatcher(roots, debounce)
+    console.print(f"\n[cyan]監視中[/cyan] ({watcher.backend}): {', '.join(str(root) for root, _ in roots)}（Ctrl+C で終了）")
+    try:
+        for run_file, root in watcher:
+            if root.name.lower() == 'runs':
+                char_dir = None
+            else:
+                char_dir = root.name
+                for _, tree, _ in trees:
+                    (tree / char_dir).mkdir(exist_ok=True)
+            
+            result = _convert_task(_conversion_task(run_file, char_dir, show_deck_details, trees, manifests))
+            if "error" in result:
+                # 書き込み途中のファイルは次の変更時に再度変換される
+                for manifest in manifests.values():
+                    manifest.pop(run_file.as_posix(), None)
+                console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {result['error']}")
+                continue
+            
+            for output in result["outputs"]:
+                manifests[output["lang"]][run_file.as_posix()] = output["manifest_entry"]
+                if output["skipped"]:
+                    continue
+                output_name = output["output_file"].relative_to(output_path).as_posix()
+                if output["written"]:
+                    console.print(f"[green]✓[/green] {output_name} を生成しました")
+                else:
+                    console.print(f"[green]✓[/green] {output_name} は内容が同じため書き込みませんでした")
+            for lang, tree, _ in trees:
+                save_manifest(tree, manifests[lang])
+    except KeyboardInterrupt:
+        console.print("\n監視を終了しました。")
+    finally:
+        watcher.close()
+
+@main.command()
+@click.argument('input_dirs', nargs=-1, type=click.Path(exists=True), required=True)
+@click.option('--output-dir', '-o', default='corpus', help='Output directory for the tables')
+@click.option('--format', 'table_format', default='columns', type=click.Choice(['columns', 'csv']), show_default=True, help='Table format (columns: int32 column files + schema.json, csv: one CSV per table)')
+def export(input_dirs, output_dir, table_format):
+    """Export per-run and per-floor tables for the whole corpus."""
+    from corpus_export import open_table_writers, run_row, floor_rows
+    
+    all_run_files = collect_run_files(input_dirs)
     if not all_run_files:
         console.print("[red]エラー: .runファイルが見つかりません。[/red]")
         return
     
     console.print(f"[green]合計 {len(all_run_files)} 個のファイルを処理します...[/green]")
     
-    for run_file, char_output_path in all_run_files:
+    # コーパスを一度だけ走査し、ランごとに両テーブルへ追記する
+    writers = open_table_writers(output_dir, table_format)
+    failed = 0
+    try:
+        for run_file, _ in all_run_files:
+            try:
+                with open(run_file, 'rb') as f:
+                    data = decode_run(f.read(), RunModel.FIELDS)
+                parser = STSRunParser(data)
+            except Exception as e:
+                failed += 1
+                console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {str(e)}")
+                continue
+            run_id = writers["runs"].rows
+            writers["runs"].write_rows([run_row(run_id, run_file.as_posix(), parser)])
+            writers["floors"].write_rows(floor_rows(run_id, parser))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    
+    console.print(f"\n[green]完了![/green] テーブルは {output_dir} に保存されました。")
+    console.print(f"ラン: {writers['runs'].rows} 件, 階層: {writers['floors'].rows} 件, 失敗: {failed} 件")
+
+@main.command()
+@click.argument('input_dirs', nargs=-1, type=click.Path(exists=True))
+@click.option('--db', 'db_path', default='runs.sqlite3', show_default=True, help='SQLite database file')
+@click.option('--force', '-f', is_flag=True, help='Re-index all files even if unchanged since the last run')
+def index(input_dirs, db_path, force):
+    """Index run files (default: runs) into a SQLite database."""
+    from run_index import connect as connect_index, index_run, indexed_digests
+    
+    if not input_dirs:
+        if not Path('runs').is_dir():
+            console.print("[red]エラー: runs ディレクトリが見つかりません。[/red]")
+            return
+        input_dirs = ('runs',)
+    all_run_files = collect_run_files(input_dirs)
+    if not all_run_files:
+        console.print("[red]エラー: .runファイルが見つかりません。[/red]")
+        return
+    
+    conn = connect_index(db_path)
+    digests = {} if force else indexed_digests(conn)
+    indexed = 0
+    skipped = 0
+    failed = 0
+    try:
+        # 全体を1つのトランザクションで書き込み、失敗したランのみセーブポイントまで戻す
+        conn.execute("BEGIN")
+        for run_file, _ in all_run_files:
+            file_name = run_file.as_posix()
+            try:
+                raw = run_file.read_bytes()
+                digest = hashlib.sha256(raw).hexdigest()
+                if digests.get(file_name) == digest:
+                    skipped += 1
+                    continue
+                parser = STSRunParser(decode_run(raw, RunModel.FIELDS))
+                conn.execute("SAVEPOINT run")
+                try:
+                    index_run(conn, parser, file_name, digest)
+                except Exception:
+                    conn.execute("ROLLBACK TO run")
+                    raise
+                finally:
+                    conn.execute("RELEASE run")
+                indexed += 1
+            except Exception as e:
+                failed += 1
+                console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {str(e)}")
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    
+    console.print(f"\n[green]完了![/green] インデックスは {db_path} に保存されました。")
+    console.print(f"追加・更新: {indexed} 件, スキップ: {skipped} 件, 失敗: {failed} 件")
+
+@main.command()
+@click.option('--db', 'db_path', default='runs.sqlite3', show_default=True, help='SQLite database file')
+@click.option('--character', '-c', help='Character (e.g. silent, THE_SILENT)')
+@click.option('--min-ascension', type=int, help='Minimum ascension level')
+@click.option('--max-ascension', type=int, help='Maximum ascension level')
+@click.option('--victory/--loss', default=None, help='Only victories / only losses')
+@click.option('--killed-by', help='Enemy that ended the run')
+@click.option('--enemy', help='Enemy fought at any floor')
+@click.option('--event', help='Event encountered at any floor')
+@click.option('--item', help='Card, relic or potion obtained, purchased or purged')
+@click.option('--limit', '-n', type=click.IntRange(min=1), help='Maximum number of runs')
+@click.option('--sql', help='Run a read-only SQL query instead of the filters')
+@click.option('--json', 'as_json', is_flag=True, help='Print results as JSON')
+def query(db_path, character, min_ascension, max_ascension, victory, killed_by, enemy, event, item, limit, sql, as_json):
+    """Query the SQLite run index.
+    
+    Example: query -c silent --min-ascension 10 --loss --killed-by "Time Eater"
+    """
+    from run_index import build_query, connect_readonly as connect_index_readonly
+    
+    if sql:
+        params = []
+    else:
+        sql, params = build_query(character, min_ascension, max_ascension, victory, killed_by, enemy, event, item, limit)
+    
+    try:
+        conn = connect_index_readonly(db_path)
+    except FileNotFoundError as e:
+        console.print(f"[red]エラー[/red]: {str(e)}")
+        return
+    try:
+        start = time.perf_counter()
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        columns = [description[0] for description in cursor.description or []]
+    except Exception as e:
+        console.print(f"[red]エラー[/red]: クエリの実行中にエラーが発生しました: {str(e)}")
+        return
+    finally:
+        conn.close()
+    
+    if as_json:
+        click.echo(json.dumps([dict(zip(columns, row)) for row in rows], ensure_ascii=False, indent=2))
+        return
+    
+    from rich.table import Table
+    
+    table = Table()
+    for column in columns:
+        table.add_column(column)
+    for row in rows:
+        table.add_row(*("" if value is None else str(value) for value in row))
+    console.print(table)
+    console.print(f"{len(rows)} 件 ({elapsed * 1000:.1f} ms)")
+
+def _stats_table(title, columns, rows):
+    from rich.table import Table
+    
+    table = Table(title=title, title_justify="left")
+    for column, justify in columns:
+        table.add_column(column, justify=justify)
+    for row in rows:
+        table.add_row(*row)
+    return table
+
+def _format_rate(rate):
+    return "-" if rate is None else f"{rate * 100:.1f}%"
+
+def print_stats(stats, lang="en", top=10):
+    """集計結果をグループごとに rich のテーブルで表示"""
+    for character, ascension, group in stats.sorted_groups():
+        title = translate(character, lang) if character else "All"
+        if ascension is not None:
+            title += f" A{ascension}"
+        console.print(f"\n[bold]{title}[/bold]: {group.runs} runs, {group.wins} wins ({_format_rate(group.wins / group.runs)})")
+        
+        # 提示回数の多い順（同数の場合は取得率の高い順）
+        cards = sorted(group.cards.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:top]
+        console.print(_stats_table(
+            "Card pick rate",
+            [("Card", "left"), ("Offered", "right"), ("Picked", "right"), ("Pick rate", "right")],
+            [(translate(card, lang), str(offered), str(picked), _format_rate(picked / offered)) for card, (offered, picked) in cards],
+        ))
+        
+        relics = sorted(group.relics.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:top]
+        console.print(_stats_table(
+            "Win rate by relic",
+            [("Relic", "left"), ("Runs", "right"), ("Wins", "right"), ("Win rate", "right")],
+            [(translate(relic, lang), str(runs), str(wins), _format_rate(wins / runs)) for relic, (runs, wins) in relics],
+        ))
+        
+        encounters = sorted(group.encounters.items(), key=lambda item: (-item[1][0], item[0]))[:top]
+        console.print(_stats_table(
+            "Encounters",
+            [("Enemies", "left"), ("Fights", "right"), ("Avg damage", "right"), ("Avg turns", "right"), ("Max damage", "right")],
+            [
+                (translate(enemies, lang), str(fights), f"{damage / fights:.1f}", f"{turns / fights:.1f}", f"{max_damage:g}")
+                for enemies, (fights, damage, turns, max_damage) in encounters
+            ],
+        ))
+        
+        if group.deaths:
+            deaths = sorted(group.deaths.items(), key=lambda item: (-item[1], item[0]))[:top]
+            console.print(_stats_table(
+                "Death causes",
+                [("Killed by", "left"), ("Runs", "right"), ("Share", "right")],
+                [(translate(killed_by, lang), str(count), _format_rate(count / (group.runs - group.wins))) for killed_by, count in deaths],
+            ))
+
+@main.command()
+@click.argument('input_dirs', nargs=-1, type=click.Path(exists=True))
+@click.option('--group-by', default='character-ascension', type=click.Choice(RunStats.GROUP_BY), show_default=True, help='Grouping of the statistics')
+@click.option('--top', default=10, type=click.IntRange(min=1), show_default=True, help='Rows per table')
+@click.option('--lang', '-l', default='en', type=click.Choice(['en', 'ja']), help='Language for names in the tables (en/ja)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the full statistics as JSON to this file instead of printing tables')
+def stats(input_dirs, group_by, top, lang, output):
+    """Cross-run statistics (default input: runs), grouped by character and ascension."""
+    if not input_dirs:
+        if not Path('runs').is_dir():
+            console.print("[red]エラー: runs ディレクトリが見つかりません。[/red]")
+            return
+        input_dirs = ('runs',)
+    all_run_files = collect_run_files(input_dirs)
+    if not all_run_files:
+        console.print("[red]エラー: .runファイルが見つかりません。[/red]")
+        return
+    
+    # ランは1件ずつ読み込んで集計し、保持しない
+    run_stats = RunStats(group_by)
+    failed = 0
+    for run_file, _ in all_run_files:
         try:
-            console.print(f"Processing: {run_file.parent.name}/{run_file.name}")
-            
-            # Markdownの生成
-            markdown_content = parse_run_file(run_file, lang, show_deck_details)
-            
-            # 出力ファイル名の生成
-            output_file = char_output_path / f"{run_file.stem}.md"
-            
-            # ファイルの書き込み
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            console.print(f"[green]✓[/green] {char_output_path.name}/{output_file.name} を生成しました")
-            
+            with open(run_file, 'rb') as f:
+                run_stats.add(RunModel.from_dict(decode_run(f.read(), STATS_FIELDS)))
         except Exception as e:
-            import traceback
-            console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {e}")
-            console.print(f"[red]詳細[/red]: {traceback.format_exc()}")
+            failed += 1
+            console.print(f"[red]エラー[/red]: {run_file.name} の処理中にエラーが発生しました: {str(e)}")
     
-    console.print(f"\n[green]完了![/green] Markdownファイルは {output_path} に保存されました。")
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(run_stats.to_dict(), f, ensure_ascii=False, indent=2)
+        console.print(f"\n[green]完了![/green] 統計は {output} に保存されました。")
+    else:
+        print_stats(run_stats, lang, top)
+    if failed:
+        console.print(f"失敗: {failed} 件")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
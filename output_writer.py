@@ -0,0 +1,97 @@
+"""出力ファイルの書き込み
+
+内容が既存のファイルと同じ場合は書き込まず（更新時刻も変えない）、変わった場合は同じディレクトリの一時ファイルに
+書き込んでから置き換える。読み込み側が書き込み途中の内容を見ることはない。
+生成しながら渡された内容は全体をメモリに保持せず、一時ファイルに書き込みながら既存のファイルと比較する。
+"""
+import hashlib
+import os
+import tempfile
+
+_BLOCK_SIZE = 64 * 1024
+
+# 一時ファイルは 0600 で作成されるため、置き換え後の権限は通常の open と同じく umask から決める
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.digest()
+
+def encode_chunks(chunks):
+    """テキストのチャンクを UTF-8 の bytes のリストに変換（テキストモードの open と同じく改行はプラットフォームの改行にする）"""
+    return list(iter_encoded_chunks(chunks))
+
+def iter_encoded_chunks(chunks):
+    """encode_chunks と同じ変換を、チャンクを受け取るごとに1つずつ行う（全体をメモリに保持しない）"""
+    if os.linesep != "\n":
+        for chunk in chunks:
+            yield chunk.replace("\n", os.linesep).encode('utf-8')
+    else:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+
+def is_unchanged(path, data):
+    """path の内容が data（bytes のリスト）と同じか（サイズを比較し、同じ場合のみハッシュを比較する）"""
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        return False
+    if size != sum(len(block) for block in data):
+        return False
+    digest = hashlib.sha256()
+    for block in data:
+        digest.update(block)
+    return _file_digest(path) == digest.digest()
+
+def _write_temp(path, data):
+    """data を path と同じディレクトリの一時ファイルに書き込み、(一時ファイルのパス, サイズ, SHA-256) を返す"""
+    directory, name = os.path.split(os.fspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        size = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as f:
+            for block in data:
+                f.write(block)
+                size += len(block)
+                digest.update(block)
+    except BaseException:
+        _discard(temp_path)
+        raise
+    return temp_path, size, digest.digest()
+
+def _discard(temp_path):
+    try:
+        os.unlink(temp_path)
+    except FileNotFoundError:
+        pass
+
+def write_if_changed(path, data):
+    """data を path に書き込み、書き込んだ場合は True、内容が同じだった場合は False を返す
+    
+    data が bytes のリストの場合は書き込む前に既存のファイルと比較する。それ以外のイテラブル（bytes を順に生成する
+    ジェネレーターなど）は全体をメモリに保持せずに一時ファイルに書き込み、既存のファイルと同じだった場合は一時ファイルを削除する。
+    """
+    if isinstance(data, list) and is_unchanged(path, data):
+        return False
+    
+    temp_path, size, digest = _write_temp(path, data)
+    try:
+        if not isinstance(data, list):
+            try:
+                unchanged = os.stat(path).st_size == size and _file_digest(path) == digest
+            except FileNotFoundError:
+                unchanged = False
+            if unchanged:
+                _discard(temp_path)
+                return False
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        _discard(temp_path)
+        raise
+    return True
@@ -0,0 +1,198 @@
+"""ランデータのSQLiteインデックス
+
+ランのヘッダー（runs）と、get_floor_data から作成した階層（floors）・イベント（events）・
+取得アイテム（items）のテーブルを持つ。ランは play_id をキーに upsert する。
+"""
+import sqlite3
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    play_id TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    character_chosen TEXT,
+    ascension_level INTEGER,
+    floor_reached INTEGER,
+    victory INTEGER,
+    killed_by TEXT,
+    score INTEGER,
+    playtime INTEGER,
+    seed_played TEXT,
+    neow_bonus TEXT,
+    neow_cost TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_character_ascension ON runs (character_chosen, ascension_level);
+CREATE INDEX IF NOT EXISTS runs_killed_by ON runs (killed_by COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS runs_file ON runs (file);
+
+CREATE TABLE IF NOT EXISTS floors (
+    play_id TEXT NOT NULL REFERENCES runs (play_id) ON DELETE CASCADE,
+    floor INTEGER NOT NULL,
+    path TEXT,
+    gold INTEGER,
+    current_hp INTEGER,
+    max_hp INTEGER,
+    damage INTEGER,
+    turns INTEGER,
+    enemies TEXT,
+    picked TEXT,
+    campfire TEXT,
+    campfire_card TEXT,
+    PRIMARY KEY (play_id, floor)
+);
+CREATE INDEX IF NOT EXISTS floors_enemies ON floors (enemies COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS events (
+    play_id TEXT NOT NULL REFERENCES runs (play_id) ON DELETE CASCADE,
+    floor INTEGER NOT NULL,
+    event_name TEXT,
+    player_choice TEXT
+);
+CREATE INDEX IF NOT EXISTS events_play_id ON events (play_id);
+CREATE INDEX IF NOT EXISTS events_event_name ON events (event_name COLLATE NOCASE);
+
+-- kind: card / relic / potion / purchase / purge
+CREATE TABLE IF NOT EXISTS items (
+    play_id TEXT NOT NULL REFERENCES runs (play_id) ON DELETE CASCADE,
+    floor INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_play_id ON items (play_id);
+CREATE INDEX IF NOT EXISTS items_item ON items (item COLLATE NOCASE, kind);
+"""
+
+# query の結果に含める runs の列
+RESULT_COLUMNS = [
+    "play_id", "character_chosen", "ascension_level", "floor_reached", "victory", "killed_by", "score", "seed_played", "file",
+]
+
+def connect(db_path):
+    """データベースを開き、スキーマを作成する（トランザクションは呼び出し側で明示的に管理する）"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = ON")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        conn.close()
+        raise ValueError(f"{db_path} のスキーマのバージョン ({version}) に対応していません")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+def connect_readonly(db_path):
+    """検索用にデータベースを読み取り専用で開く"""
+    if not Path(db_path).is_file():
+        raise FileNotFoundError(f"{db_path} が見つかりません。先に index を実行してください")
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+
+def indexed_digests(conn):
+    """インデックス済みのファイル -> ハッシュ"""
+    return dict(conn.execute("SELECT file, sha256 FROM runs"))
+
+def index_run(conn, parser, file_name, digest):
+    """ランを upsert し、子テーブルの行を置き換える（play_id がない場合はファイル名をキーにする）"""
+    run = parser.run
+    play_id = run.play_id or f"file:{file_name}"
+    conn.execute(
+        """
+        INSERT INTO runs (play_id, file, sha256, character_chosen, ascension_level, floor_reached, victory,
+                          killed_by, score, playtime, seed_played, neow_bonus, neow_cost)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (play_id) DO UPDATE SET
+            file = excluded.file, sha256 = excluded.sha256, character_chosen = excluded.character_chosen,
+            ascension_level = excluded.ascension_level, floor_reached = excluded.floor_reached,
+            victory = excluded.victory, killed_by = excluded.killed_by, score = excluded.score,
+            playtime = excluded.playtime, seed_played = excluded.seed_played,
+            neow_bonus = excluded.neow_bonus, neow_cost = excluded.neow_cost
+        """,
+        (
+            play_id, file_name, digest, run.character_chosen, run.ascension_level, run.floor_reached,
+            bool(run.victory), None if run.victory else run.killed_by, run.score, run.playtime,
+            run.seed_played, run.neow_bonus, run.neow_cost,
+        ),
+    )
+    for table in ("floors", "events", "items"):
+        conn.execute(f"DELETE FROM {table} WHERE play_id = ?", (play_id,))
+    
+    floors = []
+    events = []
+    items = []
+    for floor in range(1, run.floor_reached + 1):
+        floor_data = parser.get_floor_data(floor)
+        damage = floor_data["damage_taken"]
+        card_choice = floor_data["cards_obtained"]
+        campfire = floor_data["campfire_choices"]
+        event = floor_data["event_choices"]
+        floors.append((
+            play_id,
+            floor,
+            floor_data["path"],
+            floor_data["gold"],
+            floor_data["current_hp"],
+            floor_data["max_hp"],
+            damage.damage if damage else None,
+            damage.turns if damage else None,
+            damage.enemies if damage else None,
+            card_choice.picked if card_choice and card_choice.picked != "SKIP" else None,
+            campfire.action if campfire else None,
+            campfire.data if campfire else None,
+        ))
+        if event:
+            events.append((play_id, floor, event.event_name, event.player_choice))
+        if card_choice and card_choice.picked and card_choice.picked != "SKIP":
+            items.append((play_id, floor, "card", card_choice.picked))
+        items.extend((play_id, floor, "relic", relic) for relic in floor_data["relics_obtained"])
+        items.extend((play_id, floor, "potion", potion) for potion in floor_data["potions_obtained"])
+        items.extend((play_id, floor, purchase["type"], purchase["item"]) for purchase in floor_data["shop_purchases"])
+    
+    conn.executemany("INSERT INTO floors VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", floors)
+    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?)", events)
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?)", items)
+    return play_id
+
+def _character_names(character):
+    """キャラクター名の表記ゆれ（silent, THE_SILENT など）を吸収"""
+    name = character.upper().replace(" ", "_")
+    return [name, name[len("THE_"):] if name.startswith("THE_") else "THE_" + name]
+
+def build_query(character=None, min_ascension=None, max_ascension=None, victory=None, killed_by=None,
+                enemy=None, event=None, item=None, limit=None):
+    """条件から runs を検索するSQLとパラメーターを作成"""
+    conditions = []
+    params = []
+    if character:
+        conditions.append("character_chosen IN (?, ?)")
+        params.extend(_character_names(character))
+    if min_ascension is not None:
+        conditions.append("ascension_level >= ?")
+        params.append(min_ascension)
+    if max_ascension is not None:
+        conditions.append("ascension_level <= ?")
+        params.append(max_ascension)
+    if victory is not None:
+        conditions.append("victory = ?")
+        params.append(int(victory))
+    if killed_by:
+        conditions.append("killed_by = ? COLLATE NOCASE")
+        params.append(killed_by)
+    if enemy:
+        conditions.append("play_id IN (SELECT play_id FROM floors WHERE enemies = ? COLLATE NOCASE)")
+        params.append(enemy)
+    if event:
+        conditions.append("play_id IN (SELECT play_id FROM events WHERE event_name = ? COLLATE NOCASE)")
+        params.append(event)
+    if item:
+        conditions.append("play_id IN (SELECT play_id FROM items WHERE item = ? COLLATE NOCASE)")
+        params.append(item)
+    
+    sql = f"SELECT {', '.join(RESULT_COLUMNS)} FROM runs"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY character_chosen, ascension_level DESC, score DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
@@ -0,0 +1,14 @@
+"""ランファイルのデコード
+
+.run ファイルには変換で使わないフィールド（score_breakdown, relic_stats,
+basemod:card_modifiers など）が多く含まれる。decode_run は json.loads で一括デコードし、
+必要なフィールドのみを残す（Python側でフィールドごとに走査するより、大きなファイルでも一括デコードの方が速い）。
+"""
+import json
+
+def decode_run(text, fields):
+    """JSON（str または UTF-8 の bytes）をデコードし、fields に含まれるトップレベルのフィールドのみを返す"""
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("ランファイルのトップレベルがJSONオブジェクトではありません")
+    return {key: value for key, value in data.items() if key in fields}
@@ -0,0 +1,195 @@
+"""ランデータのコンパクトなモデル
+
+デコード済みのランデータ（dict）を __slots__ のレコードと array('i') の階層ごとの列に変換する。
+IDの文字列はインターンし、多数のランを同時に保持する場合のメモリを抑える。
+"""
+import sys
+from array import array
+
+_intern = sys.intern
+
+def _id(value):
+    """IDの文字列をインターン（文字列以外はそのまま）"""
+    return _intern(value) if type(value) is str else value
+
+def _ids(values):
+    return tuple([_id(value) for value in values or ()])
+
+def _int_column(values):
+    """整数の列を array('i') に格納（整数以外を含む場合はタプルのまま）"""
+    values = values or ()
+    try:
+        return array('i', values)
+    except (TypeError, OverflowError):
+        return tuple(values)
+
+class _Record:
+    __slots__ = ()
+    
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class FloorItem(_Record):
+    """階層で取得したポーション・レリック"""
+    
+    __slots__ = ("floor", "key")
+    
+    def __init__(self, floor, key):
+        self.floor = floor
+        self.key = key
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("floor", 999), _id(entry.get("key")))
+
+class CardChoice(_Record):
+    """カード報酬の選択"""
+    
+    __slots__ = ("floor", "picked", "not_picked")
+    
+    def __init__(self, floor, picked, not_picked):
+        self.floor = floor
+        self.picked = picked
+        self.not_picked = not_picked
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("floor", 999), _id(entry.get("picked", "")), _ids(entry.get("not_picked")))
+
+class DamageEntry(_Record):
+    """戦闘で受けたダメージ"""
+    
+    __slots__ = ("floor", "enemies", "damage", "turns")
+    
+    def __init__(self, floor, enemies, damage, turns):
+        self.floor = floor
+        self.enemies = enemies
+        self.damage = damage
+        self.turns = turns
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("floor", 999), _id(entry.get("enemies")), entry.get("damage"), entry.get("turns"))
+
+class CampfireChoice(_Record):
+    """休憩所での行動（data は強化したカードなど）"""
+    
+    __slots__ = ("floor", "action", "data")
+    
+    def __init__(self, floor, action, data):
+        self.floor = floor
+        self.action = action
+        self.data = data
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("floor", 999), _id(entry.get("key", "")), _id(entry.get("data")))
+
+class ShopEntry(_Record):
+    """ショップの商品（購入されずに残ったもの）"""
+    
+    __slots__ = ("floor", "cards", "relics", "potions")
+    
+    def __init__(self, floor, cards, relics, potions):
+        self.floor = floor
+        self.cards = cards
+        self.relics = relics
+        self.potions = potions
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(
+            entry.get("floor", 999), _ids(entry.get("cards")), _ids(entry.get("relics")), _ids(entry.get("potions"))
+        )
+
+class EventChoice(_Record):
+    """イベントでの選択とデッキへの影響"""
+    
+    __slots__ = (
+        "floor", "event_name", "player_choice", "cards_removed", "cards_upgraded", "cards_transformed", "cards_obtained"
+    )
+    
+    def __init__(self, floor, event_name, player_choice, cards_removed, cards_upgraded, cards_transformed, cards_obtained):
+        self.floor = floor
+        self.event_name = event_name
+        self.player_choice = player_choice
+        self.cards_removed = cards_removed
+        self.cards_upgraded = cards_upgraded
+        self.cards_transformed = cards_transformed
+        self.cards_obtained = cards_obtained
+    
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(
+            entry.get("floor", 999),
+            _id(entry.get("event_name", "Unknown")),
+            _id(entry.get("player_choice", "")),
+            _ids(entry.get("cards_removed")),
+            _ids(entry.get("cards_upgraded")),
+            _ids(entry.get("cards_transformed")),
+            _ids(entry.get("cards_obtained")),
+        )
+
+class RunModel(_Record):
+    """変換に必要なフィールドのみを持つランデータ"""
+    
+    # 変換・インデックスで参照するトップレベルのフィールド（これ以外はデコードしない）
+    FIELDS = frozenset([
+        "play_id", "character_chosen", "seed_played", "ascension_level", "floor_reached", "victory", "killed_by",
+        "score", "playtime", "master_deck", "relics", "neow_bonus", "neow_cost", "neow_bonus_log",
+        "path_per_floor", "gold_per_floor", "current_hp_per_floor", "max_hp_per_floor",
+        "potions_obtained", "card_choices", "relics_obtained", "damage_taken", "campfire_choices",
+        "shop_contents", "event_choices", "items_purchased", "item_purchase_floors",
+        "items_purged", "items_purged_floors", "potion_use_per_floor", "potion_discard_per_floor",
+    ])
+    
+    __slots__ = (
+        "play_id", "character_chosen", "seed_played", "ascension_level", "floor_reached", "victory", "killed_by",
+        "score", "playtime", "master_deck", "relics", "neow_bonus", "neow_cost", "neow_relics",
+        "path_per_floor", "gold_per_floor", "current_hp_per_floor", "max_hp_per_floor",
+        "potions_obtained", "card_choices", "relics_obtained", "damage_taken", "campfire_choices",
+        "shop_contents", "event_choices", "items_purchased", "item_purchase_floors",
+        "items_purged", "items_purged_floors", "potion_use_per_floor", "potion_discard_per_floor",
+    )
+    
+    @classmethod
+    def from_dict(cls, data):
+        """デコード済みのランデータから作成"""
+        run = cls.__new__(cls)
+        run.play_id = data.get("play_id")
+        run.character_chosen = _id(data.get("character_chosen"))
+        run.seed_played = data.get("seed_played", "Unknown")
+        run.ascension_level = data.get("ascension_level", 0)
+        run.floor_reached = data.get("floor_reached", 0)
+        run.victory = data.get("victory", False)
+        run.killed_by = _id(data.get("killed_by", "Unknown"))
+        run.score = data.get("score", 0)
+        run.playtime = data.get("playtime", 0)
+        run.master_deck = _ids(data.get("master_deck"))
+        run.relics = _ids(data.get("relics"))
+        run.neow_bonus = _id(data.get("neow_bonus", "Unknown"))
+        run.neow_cost = _id(data.get("neow_cost", "Unknown"))
+        run.neow_relics = _ids((data.get("neow_bonus_log") or {}).get("relicsObtained"))
+        
+        # 階層ごとの列（インデックスは階層 - 1）
+        run.path_per_floor = _ids(data.get("path_per_floor"))
+        run.gold_per_floor = _int_column(data.get("gold_per_floor"))
+        run.current_hp_per_floor = _int_column(data.get("current_hp_per_floor"))
+        run.max_hp_per_floor = _int_column(data.get("max_hp_per_floor"))
+        run.potion_use_per_floor = tuple([_ids(potions) for potions in data.get("potion_use_per_floor") or ()])
+        run.potion_discard_per_floor = tuple([_ids(potions) for potions in data.get("potion_discard_per_floor") or ()])
+        
+        run.potions_obtained = tuple([FloorItem.from_dict(entry) for entry in data.get("potions_obtained") or ()])
+        run.card_choices = tuple([CardChoice.from_dict(entry) for entry in data.get("card_choices") or ()])
+        run.relics_obtained = tuple([FloorItem.from_dict(entry) for entry in data.get("relics_obtained") or ()])
+        run.damage_taken = tuple([DamageEntry.from_dict(entry) for entry in data.get("damage_taken") or ()])
+        run.campfire_choices = tuple([CampfireChoice.from_dict(entry) for entry in data.get("campfire_choices") or ()])
+        run.shop_contents = tuple([ShopEntry.from_dict(entry) for entry in data.get("shop_contents") or ()])
+        run.event_choices = tuple([EventChoice.from_dict(entry) for entry in data.get("event_choices") or ()])
+        
+        run.items_purchased = _ids(data.get("items_purchased"))
+        run.item_purchase_floors = _int_column(data.get("item_purchase_floors"))
+        run.items_purged = _ids(data.get("items_purged"))
+        run.items_purged_floors = _int_column(data.get("items_purged_floors"))
+        return run
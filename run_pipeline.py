@@ -0,0 +1,162 @@
+"""変換の非同期パイプライン
+
+探索・読み込み・変換・書き込みの各段を上限付きのキューでつなぎ、ディスクの入出力と変換処理を重ねて実行する。
+ファイルの読み書きはスレッドプールで実行する。変換は jobs > 1 の場合はプロセスプール、それ以外はイベントループの
+スレッドで実行し、変換中も読み込み・書き込みのスレッドは並行して進む（変換用のスレッドとの間でGILを受け渡すより速い）。
+キューに入る読み込み済みのデータ・変換済みのテキストは段ごとに queue_size 件までに制限される。
+"""
+import asyncio
+import multiprocessing
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# 段の終了を次の段に伝える
+_DONE = object()
+
+class _Resubmit(Exception):
+    """実行中のプールが作り直されたため、render をやり直す"""
+
+def _error_result(e):
+    return {"error": str(e), "detail": "".join(traceback.format_exception(type(e), e, e.__traceback__))}
+
+class ConversionPipeline:
+    """read・render・write の3段で項目を処理し、結果を入力順に on_result へ渡す
+    
+    各段の関数は dict を返す。{"next": 値} の場合は値を次の段に渡し、それ以外はその項目の最終結果とする。
+    render は jobs > 1 の場合プロセスプールで実行するため、render とその引数・戻り値は pickle できる必要がある。
+    """
+    
+    def __init__(self, read, render, write, jobs=1, io_workers=4, queue_size=16, timeout=None):
+        self.read = read
+        self.render = render
+        self.write = write
+        self.jobs = jobs
+        self.io_workers = io_workers
+        self.queue_size = queue_size
+        # render の1件あたりのタイムアウト（プロセスプールで実行する場合のみ）
+        # タイムアウトしたワーカーは処理を続けたままになるため、プールを作り直し、実行中だった他の項目は新しいプールでやり直す
+        self.timeout = timeout
+    
+    def run(self, items, on_result):
+        """すべての項目を処理する（on_result(項目, 結果) は入力順に呼ばれる）"""
+        items = list(items)
+        if not items:
+            return
+        asyncio.run(self._run(items, on_result))
+    
+    async def _run(self, items, on_result):
+        loop = asyncio.get_running_loop()
+        io_executor = ThreadPoolExecutor(self.io_workers, thread_name_prefix="pipeline-io")
+        pool = None
+        pool_size = min(self.jobs, len(items))
+        if self.jobs > 1 and len(items) > 1:
+            pool = multiprocessing.Pool(pool_size)
+        # プールで実行中の render の結果待ち
+        pending = set()
+        
+        # 結果を入力順に並べ直して渡す
+        finished = {}
+        next_index = 0
+        
+        def emit(index, result):
+            nonlocal next_index
+            finished[index] = result
+            while next_index in finished:
+                on_result(items[next_index], finished.pop(next_index))
+                next_index += 1
+        
+        async def call_io(fn, value):
+            try:
+                return await loop.run_in_executor(io_executor, fn, value)
+            except Exception as e:
+                return _error_result(e)
+        
+        def replace_pool():
+            """タイムアウトしたワーカーごとプールを終了させ、実行中だった他の項目を新しいプールに再投入させる"""
+            nonlocal pool
+            old_pool = pool
+            pool = multiprocessing.Pool(pool_size)
+            old_pool.terminate()
+            for future in pending:
+                if not future.done():
+                    future.set_exception(_Resubmit())
+        
+        async def call_render(value):
+            if pool is None:
+                try:
+                    return self.render(value)
+                except Exception as e:
+                    return _error_result(e)
+            
+            def resolve(future, set_value, result):
+                # 作り直す前のプールから届いた結果は無視する
+                if not future.done():
+                    set_value(result)
+            
+            while True:
+                future = loop.create_future()
+                pool.apply_async(
+                    self.render, (value,),
+                    callback=lambda result, future=future: loop.call_soon_threadsafe(
+                        resolve, future, future.set_result, result
+                    ),
+                    error_callback=lambda e, future=future: loop.call_soon_threadsafe(
+                        resolve, future, future.set_exception, e
+                    ),
+                )
+                pending.add(future)
+                try:
+                    return await asyncio.wait_for(future, self.timeout)
+                except _Resubmit:
+                    continue
+                except asyncio.TimeoutError:
+                    pending.discard(future)
+                    replace_pool()
+                    return {"error": f"{self.timeout} 秒以内に処理が完了しませんでした"}
+                except Exception as e:
+                    return _error_result(e)
+                finally:
+                    pending.discard(future)
+        
+        async def stage(source, call, workers, target=None, target_workers=0):
+            async def worker():
+                while True:
+                    entry = await source.get()
+                    if entry is _DONE:
+                        return
+                    index, value = entry
+                    result = await call(value)
+                    if target is not None and "next" in result:
+                        await target.put((index, result["next"]))
+                    else:
+                        emit(index, result)
+            
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            # すべてのワーカーが終了してから次の段に終了を伝える
+            if target is not None:
+                for _ in range(target_workers):
+                    await target.put(_DONE)
+        
+        async def discover(target, target_workers):
+            for index in range(len(items)):
+                await target.put((index, items[index]))
+            for _ in range(target_workers):
+                await target.put(_DONE)
+        
+        render_workers = min(self.jobs, len(items)) if pool is not None else 1
+        read_queue = asyncio.Queue(self.queue_size)
+        render_queue = asyncio.Queue(self.queue_size)
+        write_queue = asyncio.Queue(self.queue_size)
+        try:
+            await asyncio.gather(
+                discover(read_queue, self.io_workers),
+                stage(read_queue, lambda value: call_io(self.read, value), self.io_workers, render_queue, render_workers),
+                stage(render_queue, call_render, render_workers, write_queue, self.io_workers),
+                stage(write_queue, lambda value: call_io(self.write, value), self.io_workers),
+            )
+        finally:
+            io_executor.shutdown()
+            if pool is not None:
+                # タイムアウトしたワーカーはプールごと終了済みのため、残りのワーカーの終了を待つ
+                pool.close()
+                pool.join()
@@ -0,0 +1,131 @@
+"""変換の段階ごとのプロファイル（--profile）
+
+ファイルごとに各段階（デコード・パーサーの構築・階層データの取得・デッキ/レリック/ポーションの再構築・翻訳・書き込みなど）の
+処理時間を計測する。時間は入れ子になった段階を除いた時間（自身の時間）として集計する。
+"""
+import functools
+import time
+import tracemalloc
+
+# 計測する段階（表示順）
+PHASES = [
+    "discovery", "read", "decode", "parser", "floor_data", "deck", "relics", "potions", "translation", "render", "write",
+]
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start", "children")
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.children = 0.0
+        self.profiler._stack.append(self)
+        return self
+    
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        phases = self.profiler._phases
+        phases[self.name] = phases.get(self.name, 0.0) + elapsed - self.children
+
+class PhaseProfiler:
+    """ファイルごと・段階ごとの処理時間とメモリのピークを記録する"""
+    
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.files = []
+        # ファイルに属さない段階（入力ファイルの収集など）
+        self.batch_phases = {}
+        self._phases = self.batch_phases
+        self._stack = []
+        self._file = None
+        self._started = None
+        self.elapsed = None
+    
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+    
+    def stop(self):
+        self.elapsed = time.perf_counter() - self._started
+        if self.trace_memory:
+            tracemalloc.stop()
+    
+    def phase(self, name):
+        """with 文で段階の時間を計測する"""
+        return _Phase(self, name)
+    
+    def start_file(self, name, size=None):
+        self._file = {"file": name, "bytes": size, "floors": None, "phases": {}}
+        self._phases = self._file["phases"]
+        if self.trace_memory:
+            # ピークはファイルの処理開始時点から増えた分を記録する
+            tracemalloc.reset_peak()
+            self._file_memory = tracemalloc.get_traced_memory()[0]
+        self._file_started = time.perf_counter()
+    
+    def set_file_info(self, **info):
+        if self._file is not None:
+            self._file.update(info)
+    
+    def end_file(self, **info):
+        record = self._file
+        record.update(info)
+        record["seconds"] = time.perf_counter() - self._file_started
+        record["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1] - self._file_memory if self.trace_memory else None
+        self.files.append(record)
+        self._file = None
+        self._phases = self.batch_phases
+        return record
+    
+    def wrap(self, fn, name):
+        """関数の呼び出しを段階として計測する"""
+        profiler = self
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Phase(profiler, name):
+                return fn(*args, **kwargs)
+        
+        return wrapper
+    
+    def wrap_generator(self, fn, name):
+        """ジェネレーター関数の各要素の生成を段階として計測する（要素を受け取った側の処理は含めない）"""
+        profiler = self
+        
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            iterator = fn(*args, **kwargs)
+            while True:
+                with _Phase(profiler, name):
+                    try:
+                        value = next(iterator)
+                    except StopIteration:
+                        return
+                yield value
+        
+        return wrapper
+    
+    def phase_totals(self):
+        """段階ごとの合計時間（入力ファイルの収集などファイルに属さない段階を含む）"""
+        totals = dict.fromkeys(PHASES, 0.0)
+        for phases in [self.batch_phases] + [record["phases"] for record in self.files]:
+            for name, seconds in phases.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+    
+    def to_dict(self, **extra):
+        return {
+            "elapsed_seconds": self.elapsed,
+            "files": len(self.files),
+            "phase_seconds": self.phase_totals(),
+            **extra,
+            "per_file": sorted(self.files, key=lambda record: -record["seconds"]),
+        }
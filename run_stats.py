@@ -0,0 +1,131 @@
+"""複数ランにわたる統計
+
+ランを1件ずつ受け取り、キャラクター・アセンションごとの集計値のみを保持する。
+保持するデータはカード・レリック・敵の種類数に比例し、ラン数には依存しない。
+"""
+
+# 統計で参照するトップレベルのフィールド
+STATS_FIELDS = frozenset([
+    "character_chosen", "ascension_level", "victory", "killed_by", "relics", "card_choices", "damage_taken",
+])
+
+def _base_card(card):
+    """強化済みのカードは強化前のIDで集計する"""
+    return card.split("+", 1)[0]
+
+def _rate(count, total):
+    return count / total if total else None
+
+class GroupStats:
+    """キャラクター・アセンションごとの集計値"""
+    
+    def __init__(self):
+        self.runs = 0
+        self.wins = 0
+        # カード -> [提示回数, 取得回数]
+        self.cards = {}
+        # レリック -> [所持したラン数, そのうち勝利数]
+        self.relics = {}
+        # 敵 -> [戦闘回数, ダメージ合計, ターン合計, 最大ダメージ]
+        self.encounters = {}
+        # 死因 -> 回数
+        self.deaths = {}
+    
+    def add(self, run):
+        victory = bool(run.victory)
+        self.runs += 1
+        self.wins += victory
+        
+        for choice in run.card_choices:
+            picked = _base_card(choice.picked) if choice.picked and choice.picked != "SKIP" else None
+            for card in choice.not_picked:
+                self.cards.setdefault(_base_card(card), [0, 0])[0] += 1
+            if picked:
+                counts = self.cards.setdefault(picked, [0, 0])
+                counts[0] += 1
+                counts[1] += 1
+        
+        for relic in set(run.relics):
+            counts = self.relics.setdefault(relic, [0, 0])
+            counts[0] += 1
+            counts[1] += victory
+        
+        for damage in run.damage_taken:
+            if not damage.enemies:
+                continue
+            values = self.encounters.setdefault(damage.enemies, [0, 0, 0, 0])
+            values[0] += 1
+            values[1] += damage.damage or 0
+            values[2] += damage.turns or 0
+            values[3] = max(values[3], damage.damage or 0)
+        
+        if not victory:
+            killed_by = run.killed_by or "Unknown"
+            self.deaths[killed_by] = self.deaths.get(killed_by, 0) + 1
+    
+    def to_dict(self):
+        return {
+            "runs": self.runs,
+            "wins": self.wins,
+            "win_rate": _rate(self.wins, self.runs),
+            "cards": {
+                card: {"offered": offered, "picked": picked, "pick_rate": _rate(picked, offered)}
+                for card, (offered, picked) in sorted(self.cards.items())
+            },
+            "relics": {
+                relic: {"runs": runs, "wins": wins, "win_rate": _rate(wins, runs)}
+                for relic, (runs, wins) in sorted(self.relics.items())
+            },
+            "encounters": {
+                enemies: {
+                    "fights": fights,
+                    "average_damage": _rate(damage, fights),
+                    "average_turns": _rate(turns, fights),
+                    "max_damage": max_damage,
+                }
+                for enemies, (fights, damage, turns, max_damage) in sorted(self.encounters.items())
+            },
+            "deaths": dict(sorted(self.deaths.items(), key=lambda item: (-item[1], item[0]))),
+        }
+
+class RunStats:
+    """ランをグループ（キャラクター・アセンション）ごとに集計する"""
+    
+    GROUP_BY = ("character-ascension", "character", "none")
+    
+    def __init__(self, group_by="character-ascension"):
+        if group_by not in self.GROUP_BY:
+            raise ValueError(f"unknown group_by: {group_by}")
+        self.group_by = group_by
+        self.groups = {}
+    
+    def group_key(self, run):
+        character = run.character_chosen or "Unknown"
+        if self.group_by == "character-ascension":
+            return (character, run.ascension_level)
+        if self.group_by == "character":
+            return (character, None)
+        return (None, None)
+    
+    def add(self, run):
+        key = self.group_key(run)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = GroupStats()
+        group.add(run)
+    
+    def sorted_groups(self):
+        """(キャラクター, アセンション, 集計値) をキャラクター・アセンション順に返す"""
+        return [
+            (character, ascension, self.groups[(character, ascension)])
+            for character, ascension in sorted(self.groups, key=lambda key: (key[0] or "", key[1] if key[1] is not None else -1))
+        ]
+    
+    def to_dict(self):
+        return {
+            "group_by": self.group_by,
+            "groups": [
+                {"character": character, "ascension_level": ascension, **group.to_dict()}
+                for character, ascension, group in self.sorted_groups()
+            ],
+        }
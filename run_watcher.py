@@ -0,0 +1,207 @@
+"""入力ディレクトリの監視
+
+新しく書き込まれた .run ファイルを検出し、書き込みが落ち着いた（debounce 秒間変更がない）時点で返す。
+Linux では inotify（ctypes 経由）を使い、使えない環境では定期的なスキャンで変更を検出する。
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct("iIII")
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+def _iter_dirs(root, recursive):
+    yield root
+    if recursive:
+        for dirpath, _, _ in os.walk(root):
+            if dirpath != str(root):
+                yield Path(dirpath)
+
+def _iter_run_files(directory):
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".run") and entry.is_file():
+                    yield Path(entry.path)
+    except FileNotFoundError:
+        return
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+class InotifyBackend:
+    """inotify による変更の検出"""
+    
+    name = "inotify"
+    
+    def __init__(self, roots, libc):
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._roots = roots
+        # watch descriptor -> (ディレクトリ, 入力ディレクトリ, 再帰的に監視するか)
+        self._watches = {}
+        for root, recursive in roots:
+            for directory in _iter_dirs(root, recursive):
+                if not self._add_watch(directory, root, recursive):
+                    # 監視数の上限などで監視できない場合はポーリングに切り替えられるよう失敗させる
+                    errno = ctypes.get_errno()
+                    self.close()
+                    raise OSError(errno, os.strerror(errno), str(directory))
+    
+    def _add_watch(self, directory, root, recursive):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            return False
+        self._watches[wd] = (directory, root, recursive)
+        return True
+    
+    def wait(self, timeout):
+        """timeout 秒（None の場合は無期限）まで待ち、変更された .run ファイルを (パス, 入力ディレクトリ) で返す"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(self._fd, 64 * 1024)
+        changed = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            
+            if mask & IN_Q_OVERFLOW:
+                # イベントが溢れた場合は全体を再スキャンする（変換済みのファイルはマニフェストでスキップされる）
+                changed.extend(self.scan())
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches:
+                continue
+            directory, root, recursive = self._watches[wd]
+            path = directory / name
+            if mask & IN_ISDIR:
+                if recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新しいサブディレクトリも監視し、監視開始前に作られたファイルを拾う
+                    for subdirectory in _iter_dirs(path, True):
+                        self._add_watch(subdirectory, root, recursive)
+                        changed.extend((run_file, root) for run_file in _iter_run_files(subdirectory))
+            elif name.endswith(".run"):
+                changed.append((path, root))
+        return changed
+    
+    def scan(self):
+        return [
+            (run_file, root)
+            for root, recursive in self._roots
+            for directory in _iter_dirs(root, recursive)
+            for run_file in _iter_run_files(directory)
+        ]
+    
+    def close(self):
+        os.close(self._fd)
+
+class PollingBackend:
+    """定期的なスキャンによる変更の検出（ファイルの更新時刻とサイズを比較）"""
+    
+    name = "polling"
+    
+    def __init__(self, roots, interval=1.0):
+        self._roots = roots
+        self.interval = interval
+        self._snapshot = self._stat_all()
+    
+    def _stat_all(self):
+        snapshot = {}
+        for root, recursive in self._roots:
+            for directory in _iter_dirs(root, recursive):
+                for run_file in _iter_run_files(directory):
+                    try:
+                        stat = run_file.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[run_file] = (root, stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def wait(self, timeout):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self._stat_all()
+        changed = [
+            (path, root)
+            for path, (root, mtime, size) in snapshot.items()
+            if self._snapshot.get(path, (None, None, None))[1:] != (mtime, size)
+        ]
+        self._snapshot = snapshot
+        return changed
+    
+    def close(self):
+        pass
+
+class RunFileWatcher:
+    """書き込みが完了した .run ファイルを (パス, 入力ディレクトリ) で順に返す
+    
+    roots は (入力ディレクトリ, 再帰的に監視するか) のリスト。
+    ファイルへの変更が debounce 秒間なければ書き込み完了とみなす。
+    """
+    
+    def __init__(self, roots, debounce=0.5, poll_interval=1.0, use_inotify=True):
+        self.debounce = debounce
+        self._backend = None
+        libc = _load_libc() if use_inotify else None
+        if libc:
+            try:
+                self._backend = InotifyBackend(roots, libc)
+            except OSError:
+                self._backend = None
+        if self._backend is None:
+            self._backend = PollingBackend(roots, poll_interval)
+        # パス -> (入力ディレクトリ, 最後に変更を検出した時刻)
+        self._pending = {}
+    
+    @property
+    def backend(self):
+        return self._backend.name
+    
+    def __iter__(self):
+        while True:
+            if self._pending:
+                oldest = min(changed_at for _, changed_at in self._pending.values())
+                timeout = max(0.0, oldest + self.debounce - time.monotonic())
+            else:
+                timeout = None
+            for path, root in self._backend.wait(timeout):
+                self._pending[path] = (root, time.monotonic())
+            
+            now = time.monotonic()
+            ready = [path for path, (_, changed_at) in self._pending.items() if now - changed_at >= self.debounce]
+            for path in ready:
+                root, _ = self._pending.pop(path)
+                if path.is_file():
+                    yield path, root
+    
+    def close(self):
+        self._backend.close()
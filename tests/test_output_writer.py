@@ -0,0 +1,32 @@
+import os
+
+from output_writer import write_if_changed
+
+def generate(*blocks):
+    yield from blocks
+
+def test_streamed_content_is_compared_without_rewriting(tmp_path):
+    path = tmp_path / "run.md"
+    assert write_if_changed(path, generate(b"# Run\n", b"floor 1\n")) is True
+    os.utime(path, (0, 0))
+    
+    assert write_if_changed(path, generate(b"# Run\n", b"floor 1\n")) is False
+    assert os.stat(path).st_mtime == 0
+    assert write_if_changed(path, generate(b"# Run\n", b"floor 2\n")) is True
+    assert path.read_bytes() == b"# Run\nfloor 2\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["run.md"]
+
+def test_failed_stream_leaves_existing_file(tmp_path):
+    path = tmp_path / "run.md"
+    path.write_bytes(b"old\n")
+    
+    def failing():
+        yield b"new\n"
+        raise ValueError("render failed")
+    
+    try:
+        write_if_changed(path, failing())
+    except ValueError:
+        pass
+    assert path.read_bytes() == b"old\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["run.md"]
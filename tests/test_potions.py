@@ -0,0 +1,22 @@
+import json
+from pathlib import Path
+
+from json_to_markdown import STSRunParser
+
+RUNS = Path(__file__).resolve().parent.parent / "runs"
+
+def load_run(name):
+    return json.loads((RUNS / name).read_text(encoding="utf-8"))
+
+def test_potion_picked_up_and_used_on_same_floor_is_removed():
+    # 25階の報酬のフルーツジュースはその階で使用し、30階のリキッドブロンズが空いたスロットに入る
+    parser = STSRunParser(load_run("THE_SILENT/1743345078.run"), "en", True)
+    assert "Fruit Juice" not in parser._get_potions_at_floor(26)
+    for floor in (31, 32):
+        assert parser._get_potions_at_floor(floor) == ["CunningPotion", "LiquidBronze"]
+
+def test_discard_to_make_room_still_applies_before_pickup():
+    # 8階でスモークボムを破棄し、空いたスロットに古代のポーションが入る
+    parser = STSRunParser(load_run("IRONCLAD/1742427787.run"), "en", True)
+    assert parser._get_potions_at_floor(7) == ["SmokeBomb", "ElixirPotion"]
+    assert parser._get_potions_at_floor(8) == ["ElixirPotion", "Ancient Potion"]
@@ -0,0 +1,29 @@
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import json_to_markdown
+
+RUNS = Path(__file__).resolve().parent.parent / "runs"
+
+def convert(*args):
+    result = CliRunner().invoke(json_to_markdown.main, ["convert", *map(str, args)])
+    assert result.exit_code == 0, result.output
+    return result
+
+def test_profile_marks_runs_skipped_in_every_language(tmp_path):
+    input_dir = tmp_path / "IRONCLAD"
+    input_dir.mkdir()
+    run_file = RUNS / "IRONCLAD" / "1742723287.run"
+    (input_dir / run_file.name).write_bytes(run_file.read_bytes())
+    output_dir = tmp_path / "output"
+    report_path = tmp_path / "profile.json"
+    
+    convert(input_dir, "-o", output_dir, "--lang", "en,ja")
+    convert(input_dir, "-o", output_dir, "--lang", "en,ja", "--profile", "--profile-output", report_path)
+    
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["files"] == 1
+    assert report["per_file"][0]["skipped"] is True
+    assert report["per_file"][0]["error"] is None
@@ -0,0 +1,11 @@
+from run_model import RunModel
+
+def test_from_dict_accepts_null_fields():
+    run = RunModel.from_dict({"neow_bonus_log": None, "card_choices": None, "potion_use_per_floor": None})
+    assert run.neow_relics == ()
+    assert run.card_choices == ()
+    assert run.potion_use_per_floor == ()
+
+def test_from_dict_reads_neow_relics():
+    run = RunModel.from_dict({"neow_bonus_log": {"relicsObtained": ["Anchor"]}})
+    assert run.neow_relics == ("Anchor",)
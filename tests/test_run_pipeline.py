@@ -0,0 +1,23 @@
+import time
+
+from run_pipeline import ConversionPipeline
+
+def passthrough(value):
+    return {"next": value}
+
+def render(value):
+    # 0 番目の項目だけタイムアウトするまで終わらない
+    time.sleep(30 if value == 0 else 0.6)
+    return {"next": value}
+
+def write(value):
+    return {"value": value}
+
+def test_timed_out_worker_does_not_stall_later_items():
+    results = []
+    pipeline = ConversionPipeline(passthrough, render, write, jobs=2, io_workers=2, timeout=1)
+    pipeline.run(range(5), lambda item, result: results.append((item, result)))
+    
+    assert [item for item, _ in results] == [0, 1, 2, 3, 4]
+    assert "error" in results[0][1]
+    assert [result for _, result in results[1:]] == [{"value": value} for value in range(1, 5)]
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+from json_to_markdown import STSRunParser
+
+RUNS = Path(__file__).resolve().parent.parent / "runs"
+
+def load_run(name):
+    return json.loads((RUNS / name).read_text(encoding="utf-8"))
+
+def test_unused_purchased_potion_is_not_added_to_deck():
+    # 29階で購入し、一度も使わなかった筋力ポーションはデッキに入らない
+    run = load_run("IRONCLAD/1742723287.run")
+    parser = STSRunParser(run, "en", True)
+    assert parser._shop_item_types["Strength Potion"] != "card"
+    assert parser._get_deck_at_floor(run["floor_reached"]) == sorted(run["master_deck"])
+    deck_lines = [line for line in parser.to_markdown().splitlines() if line.startswith("- **Current Deck**")]
+    assert not any("Strength Potion" in line for line in deck_lines)
+
+def test_purchased_card_seen_only_in_event_transform_or_obtain_is_card():
+    # 購入したカードがイベントでの変化・取得のログにしか現れない場合もカードとして扱う
+    run = {
+        "character_chosen": "IRONCLAD", "floor_reached": 4, "master_deck": ["Strike_R", "Clothesline"],
+        "items_purchased": ["Pommel Strike", "Headbutt"], "item_purchase_floors": [2, 2],
+        "event_choices": [
+            {"floor": 3, "event_name": "Transmorgrifier", "cards_transformed": ["Pommel Strike"], "cards_obtained": ["Clothesline"]},
+            {"floor": 4, "event_name": "Duplicator", "cards_obtained": ["Headbutt"]},
+        ],
+        "path_per_floor": ["M", "$", "?", "?"],
+    }
+    parser = STSRunParser(run, "en", True)
+    assert parser._shop_item_types == {"Pommel Strike": "card", "Headbutt": "card"}
+    assert {"Pommel Strike", "Headbutt"} <= set(parser._get_deck_at_floor(2))
@@ -0,0 +1,134 @@
+"""Translation lookups backed by a prebuilt per-language table cache
+
+Executing the TRANSLATIONS literal in translations.py costs far more than looking anything up in it, especially
+when its bytecode is not cached (fresh checkouts, PYTHONDONTWRITEBYTECODE). The compiled per-language table and
+its fingerprint are therefore stored in __pycache__ next to translations.py, keyed by the SHA-256 of that file,
+and translations.py is only imported when the cache is missing or stale.
+"""
+import hashlib
+import marshal
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# Bump when the layout of the compiled table changes
+_CACHE_VERSION = 1
+_SOURCE = Path(__file__).with_name("translations.py")
+_CACHE_DIR = _SOURCE.parent / "__pycache__"
+
+# Per-language (table, fingerprint), loaded or compiled on first use
+_TABLES = {}
+_STATS = {"hits": 0, "misses": 0, "cache_loads": 0, "cache_builds": 0}
+
+def _cache_path(lang):
+    # marshal data is only guaranteed to load on the interpreter that wrote it
+    return _CACHE_DIR / f"translations.{lang}.{sys.implementation.cache_tag}.table"
+
+def _source_digest():
+    return hashlib.sha256(_SOURCE.read_bytes()).digest()
+
+def _compile_table(lang):
+    """Build the lookup table and fingerprint for a language from TRANSLATIONS"""
+    import json
+    from translations import TRANSLATIONS
+    
+    table = {}
+    # Upgraded variants first so that explicit entries take precedence
+    for key, value in TRANSLATIONS.items():
+        table[key + "+1"] = value.get(lang, key) + "+1"
+    for key, value in TRANSLATIONS.items():
+        table[key] = value.get(lang, key)
+    entries = {key: value.get(lang) for key, value in TRANSLATIONS.items()}
+    encoded = json.dumps(entries, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return table, hashlib.sha256(encoded).hexdigest()[:16]
+
+def _load_table(lang):
+    """Load the compiled table for a language from the cache, rebuilding the cache when translations.py changed"""
+    digest = _source_digest()
+    path = _cache_path(lang)
+    try:
+        version, cached_digest, table, fingerprint = marshal.loads(path.read_bytes())
+        if version == _CACHE_VERSION and cached_digest == digest:
+            _STATS["cache_loads"] += 1
+            return table, fingerprint
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    
+    from output_writer import write_if_changed
+    
+    table, fingerprint = _compile_table(lang)
+    _STATS["cache_builds"] += 1
+    try:
+        path.parent.mkdir(exist_ok=True)
+        write_if_changed(path, [marshal.dumps((_CACHE_VERSION, digest, table, fingerprint))])
+    except OSError:
+        # A read-only checkout still works, it just compiles the table every run
+        pass
+    return table, fingerprint
+
+def _get_table(lang):
+    """Return the compiled lookup table for a language (loaded once per process)"""
+    entry = _TABLES.get(lang)
+    if entry is None:
+        entry = _TABLES[lang] = _load_table(lang)
+    return entry[0]
+
+@lru_cache(maxsize=4096)
+def _translate_missing(key, lang):
+    """Translate a key that is not in the compiled table (memoized)"""
+    if not key:  # Handle None or empty string
+        return key or ""
+    # If not found, check if it has a +number suffix (for upgraded cards)
+    if "+" in key:
+        parts = key.split("+")
+        base_key = parts[0]
+        suffix = "+" + parts[1]
+        # Keys without "+" are in the table exactly when they are in TRANSLATIONS
+        base = _get_table(lang).get(base_key)
+        if base is not None:
+            return base + suffix
+    return key
+
+def translate(key, lang="en"):
+    """Translate a key to the specified language"""
+    try:
+        value = _get_table(lang)[key]
+    except KeyError:
+        _STATS["misses"] += 1
+        return _translate_missing(key, lang)
+    _STATS["hits"] += 1
+    return value
+
+def translate_list(items, lang="en"):
+    """Translate a list of items"""
+    if not isinstance(items, (list, tuple)):
+        items = list(items)
+    get = _get_table(lang).get
+    translated = [get(item) for item in items]
+    misses = 0
+    if None in translated:
+        for i, value in enumerate(translated):
+            if value is None:
+                misses += 1
+                translated[i] = _translate_missing(items[i], lang)
+    _STATS["hits"] += len(translated) - misses
+    _STATS["misses"] += misses
+    return translated
+
+def cache_info():
+    """Translation lookup counters (table hits/misses, the miss memo cache and table cache loads/builds)"""
+    memo = _translate_missing.cache_info()
+    return {
+        "hits": _STATS["hits"],
+        "misses": _STATS["misses"],
+        "memo_hits": memo.hits,
+        "memo_misses": memo.misses,
+        "memo_size": memo.currsize,
+        "table_cache_loads": _STATS["cache_loads"],
+        "table_cache_builds": _STATS["cache_builds"],
+    }
+
+def fingerprint(lang="en"):
+    """Hash of the translation table for a language (changes when any of its entries change)"""
+    _get_table(lang)
+    return _TABLES[lang][1]
\ No newline at end of file
@@ -1,5 +1,4 @@
 # Slay the Spire translations
-
 TRANSLATIONS = {
     # UI and general terms
     "floor": {"en": "Floor", "ja": "階層"},
@@ -709,21 +708,5 @@ TRANSLATIONS = {
     "NO_GOLD": {"en": "Lose All Gold", "ja": "全ゴールドを失う"},
 }
 
-def translate(key, lang="en"):
-    """Translate a key to the specified language"""
-    if not key:  # Handle None or empty string
-        return key or ""
-    
-    if key in TRANSLATIONS:
-        return TRANSLATIONS[key].get(lang, key)
-    # If not found, check if it has a +number suffix (for upgraded cards)
-    if "+" in key:
-        base_key = key.split("+")[0]
-        suffix = "+" + key.split("+")[1]
-        if base_key in TRANSLATIONS:
-            return TRANSLATIONS[base_key].get(lang, base_key) + suffix
-    return key
-
-def translate_list(items, lang="en"):
-    """Translate a list of items"""
-    return [translate(item, lang) for item in items]
+# Lookups live in translation_table, which loads a prebuilt per-language cache instead of executing this module
+from translation_table import translate, translate_list, cache_info, fingerprint  # noqa: E402,F401